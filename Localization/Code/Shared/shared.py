@@ -9,7 +9,15 @@ import os
 import re
 import git
 import textwrap
-import glob
+import codecs
+import io
+import base64
+import xml.etree.ElementTree as ET
+import sqlite3
+import hashlib
+import json
+import atexit
+import plistlib
 
 #
 # File-level analysis
@@ -32,11 +40,12 @@ def extract_translation_keys_and_values_from_file(file_path):
     if file_type == '.xib' or file_type == '.storyboard':
         
         # Extract strings from IB file    
-        temp_file_path = extract_strings_from_IB_file_to_temp_file(file_path)
-        strings_text = read_tempfile(temp_file_path)
+        strings_text = extract_strings_from_IB_file(file_path)
 
         # Call
         result = extract_translation_keys_and_values_from_string(strings_text)
+    elif file_type == '.stringsdict':
+        result = extract_translation_keys_and_values_from_stringsdict(text)
     else: 
         result = extract_translation_keys_and_values_from_string(text)
     
@@ -118,9 +127,241 @@ def strings_file_regex_kv_line():
     """
     
     regex = re.compile(r'^(\+?\-?)\s*[\'\"](.+)[\'\"]\s*[=:]\s*[\'\"](.*)[\'\"][,;].*?(\/.*?(!+IS_OK).*)?$', re.MULTILINE | re.IGNORECASE)
-    
+
     return regex
-    
+
+def tokenize_strings_file(text, allow_multiline_kv=False, kv_only=False):
+
+    r"""
+    Goes through the lines of a .strings/.js file (or a git diff of one) and classifies each line as a kv-pair, comment or blank line.
+        This does the same job as the strings_file_regex_*() functions, (which we keep around as the reference for what should match) but it's a hand-written single-pass scanner.
+        The kv regex could backtrack quadratically on long lines with lots of quotes or slashes. This is linear in the length of the text no matter what. (See Localization/Code/Tests/test_strings_file_tokenizer.py)
+
+    Yields one token per line (or per multiple lines, see allow_multiline_kv). Structure of a token:
+    {
+        "type":             'kv' | 'comment' | 'blank' | None,      # None means that the line has an unknown format
+        "line":             "<the_line>",                           # Includes the trailing linebreak, so joining all the lines gives back the original text
+        "line_number":      <number>,                               # Starts at 1
+
+        # Only for 'kv' tokens:
+        "git_line_diff":    "<git_line_diff>",                      # '+', '-', '+-' or ''
+        "key":              "<translation_key>",
+        "value":            "<translation_value>",
+        "value_span":       (<start>, <end>),                       # Position of the value inside "line"
+        "is_ok_count":      <number>,
+    }
+
+    Notes:
+    - We split lines at '\n' and not with splitlines(). See parse_strings_file_content() in the UpdateStrings script for why.
+    - allow_multiline_kv makes it so the value of a kv-pair can be on one of the following lines, e.g. `'key':\n  'value',`.
+        The kv regex allows that because `\s` also matches linebreaks. That's relevant for the .js files, but for the line-based UpdateStrings parser, this should be off.
+        (The regex would also let `\s` span linebreaks before the separator or after the git diff prefix, but nobody writes files like that, so we don't support it.)
+    - kv_only skips classifying and yielding the other lines. Use it when you're only interested in the keys and values.
+    """
+
+    lines = text.split('\n')
+    last_index = len(lines) - 1
+
+    i = 0
+    while i <= last_index:
+
+        line = lines[i]
+        line_number = i+1
+
+        kv_match = _strings_file_kv_match(lines, i, allow_multiline_kv)
+
+        if kv_match:
+
+            last_i = kv_match['last_line_index']
+            if last_i != i:
+                line = '\n'.join(lines[i:last_i+1])
+                i = last_i
+            if i != last_index:
+                line += '\n'
+
+            yield {
+                "type": 'kv',
+                "line": line,
+                "line_number": line_number,
+                "git_line_diff": kv_match['git_line_diff'],
+                "key": kv_match['key'],
+                "value": kv_match['value'],
+                "value_span": kv_match['value_span'],
+                "is_ok_count": kv_match['is_ok_count'],
+            }
+        elif not kv_only:
+
+            type = 'comment' if _is_strings_file_comment_line(line) else 'blank' if _is_strings_file_blank_line(line) else None
+            if i != last_index:
+                line += '\n'
+
+            yield { "type": type, "line": line, "line_number": line_number }
+
+        i += 1
+
+def _strings_file_kv_match(lines, i, allow_multiline_kv):
+
+    r"""
+    Helper for tokenize_strings_file(). Matches the same things as strings_file_regex_kv_line()
+
+    How the regex resolves:
+    - The key is `.+` which is greedy, so the key ends at the **last** quote that is followed by `\s*[=:]\s*` and an opening quote, for which there's still a closing quote + [,;] somewhere after.
+    - The value is `.*` which is also greedy, so it ends at the **last** quote that is followed by [,;] on the line.
+    - The !IS_OK group matches the first run of '!' followed by IS_OK after the first '/' after the value.
+
+    We find all these positions with str.find()/str.rfind() and without going back and forth, so it's linear.
+    """
+
+    line = lines[i]
+    n = len(line)
+
+    # Fast path for comments and blank lines
+    if n == 0 or line[0] == '/':
+        return None
+
+    # Fast path for kv-pairs without extra quotes
+    #   Note: The regex can't backtrack since none of its parts can match a quote. If there are exactly these 4 quotes on the line, the result is the same as below.
+    m = _simple_kv_regex.match(line)
+    if m:
+        return {
+            "last_line_index": i,
+            "git_line_diff": m.group(1),
+            "key": m.group(2),
+            "value": m.group(3),
+            "value_span": m.span(3),
+            "is_ok_count": _strings_file_is_ok_count(line, m.end(3) + 2),
+        }
+
+    # Git diff prefix
+    p = 0
+    if p < n and line[p] == '+': p += 1
+    if p < n and line[p] == '-': p += 1
+    git_line_diff = line[:p]
+
+    # Opening quote of the key
+    p = _skip_whitespace(line, p)
+    if p >= n or line[p] not in '\'"':
+        return None
+    key_start = p + 1
+
+    # Closing quote of the value
+    value_close = _strings_file_value_close(line)
+
+    # Find the end of the key
+    #   We go through the quotes from right to left. We keep a separate cursor for each type of quote, so that every char is only searched once.
+    dq = line.rfind('"', key_start + 1)
+    sq = line.rfind("'", key_start + 1)
+
+    while dq >= 0 or sq >= 0:
+
+        if dq > sq:
+            k = dq
+            dq = line.rfind('"', key_start + 1, dq)
+        else:
+            k = sq
+            sq = line.rfind("'", key_start + 1, sq)
+
+        # Separator
+        j = _skip_whitespace(line, k+1)
+        if j >= n or line[j] not in '=:':
+            continue
+        j = _skip_whitespace(line, j+1)
+
+        if j < n:
+
+            # Value on the same line
+            if line[j] in '\'"' and value_close > j:
+                return {
+                    "last_line_index": i,
+                    "git_line_diff": git_line_diff,
+                    "key": line[key_start:k],
+                    "value": line[j+1:value_close],
+                    "value_span": (j+1, value_close),
+                    "is_ok_count": _strings_file_is_ok_count(line, value_close + 2),
+                }
+
+        elif allow_multiline_kv:
+
+            # Value on one of the next lines
+            #   Note: Only the last separator on a line can be followed by a linebreak, so we do this at most once per line.
+            offset = n + 1
+            for c in range(i+1, len(lines)):
+                next_line = lines[c]
+                o = _skip_whitespace(next_line, 0)
+                if o == len(next_line):
+                    offset += len(next_line) + 1
+                    continue
+                if next_line[o] in '\'"':
+                    next_value_close = _strings_file_value_close(next_line)
+                    if next_value_close > o:
+                        return {
+                            "last_line_index": c,
+                            "git_line_diff": git_line_diff,
+                            "key": line[key_start:k],
+                            "value": next_line[o+1:next_value_close],
+                            "value_span": (offset + o+1, offset + next_value_close),
+                            "is_ok_count": _strings_file_is_ok_count(next_line, next_value_close + 2),
+                        }
+                break
+
+    return None
+
+_simple_kv_regex = re.compile(r'^(\+?\-?)\s*[\'\"]([^\'\"\n]+)[\'\"]\s*[=:]\s*[\'\"]([^\'\"\n]*)[\'\"][,;][^\'\"\n]*$')
+
+def _strings_file_value_close(line):
+    # Returns index of the last quote that is followed by [,;] or -1
+    return max(line.rfind('",'), line.rfind('";'), line.rfind("',"), line.rfind("';"))
+
+def _strings_file_is_ok_count(line, start):
+
+    # Count exclamation marks of the `!IS_OK` comment after `start`
+
+    slash = line.find('/', start)
+    if slash == -1:
+        return 0
+
+    p = line.find('!', slash + 1)
+    while p != -1:
+        q = p
+        while q < len(line) and line[q] == '!':
+            q += 1
+        if line[q:q+5].lower() == 'is_ok':
+            return q - p
+        p = line.find('!', q)
+
+    return 0
+
+def _is_strings_file_comment_line(line):
+
+    # Matches the same things as strings_file_regex_comment_line()
+
+    s = len(line) - len(line.lstrip(' '))
+    if not line.startswith('/*', s):
+        return False
+
+    e = line.find('*/', s + 2)
+    while e != -1:
+        rest = e + 2
+        if rest == len(line):
+            return True
+        if line[rest].isspace() and line.startswith('//', rest + 1):
+            return True
+        e = line.find('*/', e + 1)
+
+    return False
+
+def _is_strings_file_blank_line(line):
+
+    # Matches the same things as strings_file_regex_blank_line()
+
+    stripped = line.lstrip()
+    return len(stripped) == 0 or (stripped.startswith('//') and len(stripped) < len(line))
+
+_whitespace_regex = re.compile(r'\s*') # Can't backtrack, so this is still linear
+
+def _skip_whitespace(s, p):
+    return _whitespace_regex.match(s, p).end()
+
 def extract_translation_keys_and_values_from_string(text):
 
     """
@@ -140,25 +381,25 @@ def extract_translation_keys_and_values_from_string(text):
 
     ... where <?> means that the key is optional. 
         If the input text is a git diff text with - and + at the start of lines, then the result with contain `added` and `deleted` keys, otherwise, the result will contain `value` keys.
-    """
     
-    # Get regex 
-    regex = strings_file_regex_kv_line()
+    Results are cached, see cached_extraction()
+    """
     
-    # Find matches
-    matches = regex.finditer(text)
+    return cached_extraction('keys_and_values', text, _extract_translation_keys_and_values_from_string)
+
+def _extract_translation_keys_and_values_from_string(text):
     
-    # Parse matches
+    # Parse
     
     result = dict()
-    for match in matches:
-        git_line_diff = match.group(1)
-        translation_key = match.group(2)
-        translation_value = match.group(3)
-        is_ok = match.group(5)
+    for token in tokenize_strings_file(text, allow_multiline_kv=True, kv_only=True):
+        
+        git_line_diff = token['git_line_diff']
+        translation_key = token['key']
+        translation_value = token['value']
         
         d = 'added' if git_line_diff == '+' else 'deleted' if git_line_diff == '-' else 'value'
-        k = is_ok.count('!') if is_ok != None else 0
+        k = token['is_ok_count']
         
         result.setdefault(translation_key, {})[d] = {"text": translation_value, "is_ok_count": k}
         
@@ -172,72 +413,546 @@ def extract_translation_keys_and_values_from_string(text):
     # Return
     return result
 
+def diff_translation_keys_and_values(old_keys_and_values, new_keys_and_values):
+    
+    """
+    Compares two results of extract_translation_keys_and_values_from_string() (which contain `value` keys) 
+        and returns the same structure you'd get from calling extract_translation_keys_and_values_from_string() on a `git diff` between the two files. 
+        (Which contains `added` and `deleted` keys)
+    
+    Only kv-pairs whose value or !IS_OK count changed are included. Unlike a line-based `git diff`, this isn't affected by kv-pairs moving around or by comment changes.
+    """
+    
+    result = dict()
+    
+    for key, old in old_keys_and_values.items():
+        old_value = old['value']
+        new = new_keys_and_values.get(key, None)
+        new_value = new['value'] if new != None else None
+        if old_value != new_value:
+            result[key] = {'deleted': old_value}
+            if new_value != None:
+                result[key]['added'] = new_value
+    
+    for key, new in new_keys_and_values.items():
+        if key not in old_keys_and_values:
+            result[key] = {'added': new['value']}
+    
+    return result
+
+#
+# Stringsdict extraction
+#
+
+stringsdict_plural_categories = ['zero', 'one', 'two', 'few', 'many', 'other']
+
+def extract_translation_keys_and_values_from_stringsdict(stringsdict_content):
+    
+    """
+    Extracts translation keys and values from the content of a .stringsdict file (bytes or str). 
+        Structure of result: Same as extract_translation_keys_and_values_from_string() called on a normal strings file. (With `value` keys)
+    
+    We flatten the plist into keys like this:
+        "<key>"                         ->  The NSStringLocalizedFormatKey (e.g. `%@ %#@captured@`)
+        "<key>.<variable>.<category>"   ->  The plural rule for one plural category of a variable (e.g. `capture-toast.body.captured.captured.one`)
+    The NSStringFormatSpecTypeKey and NSStringFormatValueTypeKey entries aren't translatable, so we skip them.
+    
+    Notes:
+    - plistlib drops xml comments, so there's no way to mark stringsdict values as !IS_OK. The is_ok_count is always 0.
+    - Results are cached, see cached_extraction()
+    """
+    
+    return cached_extraction('stringsdict_keys_and_values', stringsdict_content, _extract_translation_keys_and_values_from_stringsdict)
+
+def _extract_translation_keys_and_values_from_stringsdict(stringsdict_content):
+    
+    if isinstance(stringsdict_content, str):
+        stringsdict_content = stringsdict_content.encode('utf-8')
+    
+    # Handle empty file
+    if len(stringsdict_content.strip()) == 0:
+        return dict()
+    
+    # Parse
+    plist = plistlib.loads(stringsdict_content)
+    
+    # Flatten
+    result = dict()
+    for key, entry in plist.items():
+        for variable, rules in entry.items():
+            if variable == 'NSStringLocalizedFormatKey':
+                result[key] = {'value': {'text': rules, 'is_ok_count': 0}}
+            elif isinstance(rules, dict):
+                for category, text in rules.items():
+                    if category in stringsdict_plural_categories:
+                        result[f'{key}.{variable}.{category}'] = {'value': {'text': text, 'is_ok_count': 0}}
+    
+    # Return
+    return result
+
+def split_stringsdict_key(key):
+    
+    # Splits a key from extract_translation_keys_and_values_from_stringsdict() into (<key>.<variable>, <category>). Returns (key, None) for NSStringLocalizedFormatKey keys
+    
+    prefix, _, category = key.rpartition('.')
+    if category in stringsdict_plural_categories and prefix != '':
+        return prefix, category
+    else:
+        return key, None
+
 #
-# Analysis helpers
+# IB file extraction
 #
 
-def create_temp_file(suffix=''):
+IB_strings_extraction_backend = 'python' # 'python' or 'ibtool'. The 'ibtool' backend only works on macOS with Xcode installed. Use it to double-check the 'python' backend.
+
+IB_localizable_attributes = { # Maps xml attributes / `<string key="...">` child elements of IB objects to the property names that ibtool uses in the .strings file
+    'title':                'title',
+    'alternateTitle':       'alternateTitle',
+    'label':                'label',
+    'paletteLabel':         'paletteLabel',
+    'placeholderString':    'placeholderString',
+    'toolTip':              'ibShadowedToolTip',
+}
+
+def extract_strings_from_IB_file(ib_file_path, backend=None):
     
-    # Returns temp_file_path
-    #   Use os.remove(temp_file_path) after you're done with it
+    """
+    Returns the content of the .strings file that `ibtool --export-strings-file` would generate for the .xib or .storyboard file at `ib_file_path`.
+    """
     
-    temp_file_path = ''
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-        temp_file_path = temp_file.name
-    return temp_file_path
+    if backend == None:
+        backend = IB_strings_extraction_backend
+    
+    if backend == 'python':
+        with open(ib_file_path, 'rb') as file:
+            return extract_strings_from_IB_content(file.read())
+    elif backend == 'ibtool':
+        return extract_strings_from_IB_file_with_ibtool(ib_file_path)
+    else:
+        assert False, f"Unknown IB strings extraction backend: {backend}"
 
-def extract_strings_from_IB_file_to_temp_file(ib_file_path):
+def extract_strings_from_IB_content(ib_content, backend=None):
+    
+    """
+    In-process replacement for `ibtool --export-strings-file`. 
+        Takes the xml content of a .xib or .storyboard file (bytes or str) and returns the content of the .strings file that ibtool would generate.
+        With the 'ibtool' `backend`, the content is written to a temp file and we actually run ibtool.
+    
+    Notes:
+    - We stream-parse the xml with iterparse() and throw away objects once we've handled them, so this stays fast and light on memory even for large storyboards.
+    - These are the rules we found by comparing against ibtool output (See Localization/Code/Tests/test_IB_strings_extraction.py):
+        - Every object with an `id` gets one kv-pair per localizable property that's set on it: `"<ObjectID>.<property>" = "<value>";` See `IB_localizable_attributes` for the properties.
+        - Longer / multiline values are stored in `<string key="<property>">` child elements instead of attributes. Sometimes they are base64 encoded.
+        - The title of a table column's header cell is exported on the table column as `headerCell.title`.
+        - The title of a popUpButtonCell is not exported (it's just the title of the selected menu item, which is exported separately)
+        - The comment above each kv-pair contains the class (`NS` + xml tag, customClass is ignored), the value, the ObjectID, and the localizer note, if there is one.
+        - Localizer notes are stored in `<attributedString key="userComments">`. Cells inherit the note of their control.
+        - kv-pairs are sorted by key.
+    - We only handle the things we actually use in MMF's IB files. Not handled: segmented control labels, combo box items, binding placeholders, and probably more. 
+        If you start using these, run the tests to see if the output still matches.
+    - Results are cached, see cached_extraction()
+    """
+    
+    if backend == None:
+        backend = IB_strings_extraction_backend
+    
+    if backend == 'python':
+        return cached_extraction('IB_strings', ib_content, _extract_strings_from_IB_content)
+    elif backend == 'ibtool':
+        return cached_extraction('IB_strings_ibtool', ib_content, _extract_strings_from_IB_content_with_ibtool)
+    else:
+        assert False, f"Unknown IB strings extraction backend: {backend}"
 
-    # Create empty file
-    temp_file_path = create_temp_file()
+def _extract_strings_from_IB_content(ib_content):
+    
+    if isinstance(ib_content, str):
+        ib_content = ib_content.encode('utf-8')
+    
+    # Handle empty file
+    #   (ibtool fails on empty files, but we want to return an empty strings file)
+    if len(ib_content) == 0:
+        return ''
+    
+    # Parse
+    entries = []
+    for _, element in ET.iterparse(io.BytesIO(ib_content), events=('end',)):
+        
+        # Handle cells
+        #   We handle cells when their parent ends so they can inherit its note
+        for child in element:
+            if child.get('key') == 'cell' and child.get('id') != None:
+                child_note = _IB_object_note(child)
+                if child_note == None: child_note = _IB_object_note(element)
+                entries += _IB_object_strings_entries(child, child_note)
         
+        # Handle other objects
+        if element.get('id') != None and element.get('key') != 'cell' and element.tag != 'document':
+            entries += _IB_object_strings_entries(element, _IB_object_note(element))
+            element.clear() # Free memory. Children have already been handled at this point
+    
+    # Sort
+    entries.sort(key=lambda entry: entry[0])
+    
+    # Build strings file
+    result = ''.join(f'\n/* {comment} */\n"{key}" = "{escape_for_strings_file(value)}";\n' for key, comment, value in entries)
+    
+    # Return
+    return result
+
+def escape_for_strings_file(string):
+    return string.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+
+def _extract_strings_from_IB_content_with_ibtool(ib_content):
+    
+    if isinstance(ib_content, str):
+        ib_content = ib_content.encode('utf-8')
+    
+    # Write temp file
+    #   ibtool looks at the file extension to tell storyboards and xibs apart
+    file_type = '.storyboard' if b'Cocoa.Storyboard.XIB' in ib_content[:1000] else '.xib'
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ib_file_path = os.path.join(temp_dir, 'input' + file_type)
+        with open(ib_file_path, 'wb') as file:
+            file.write(ib_content)
+        return extract_strings_from_IB_file_with_ibtool(ib_file_path)
+
+def _IB_object_strings_entries(element, note):
+    
+    # Returns list of (key, comment, value) tuples for the IB object `element`
+    
+    # Get values
+    values = dict()
+    is_popup_cell = element.tag == 'popUpButtonCell'
+    if not is_popup_cell:
+        for attribute, property in IB_localizable_attributes.items():
+            value = element.get(attribute)
+            if value != None:
+                values[property] = value
+    for child in element:
+        child_key = child.get('key')
+        if child.tag == 'string' and child_key in IB_localizable_attributes and not is_popup_cell:
+            values[IB_localizable_attributes[child_key]] = _IB_string_element_text(child)
+        elif child_key == 'headerCell' and child.get('id') == None and child.get('title') != None:
+            values['headerCell.title'] = child.get('title')
+    
+    # Build entries
+    object_id = element.get('id')
+    class_name = 'NS' + element.tag[0].upper() + element.tag[1:]
+    note_str = f' Note = "{escape_for_strings_file(note)}";' if note != None else ''
+    
+    result = []
+    for property, value in values.items():
+        comment = f'Class = "{class_name}"; {property} = "{escape_for_strings_file(value)}"; ObjectID = "{object_id}";{note_str}'
+        result.append((f'{object_id}.{property}', comment, value))
+    
+    return result
+
+def _IB_object_note(element):
+    
+    # Returns the localizer note of the IB object `element` or None
+    
+    for child in element:
+        if child.tag == 'attributedString' and child.get('key') == 'userComments':
+            result = ''
+            for fragment in child:
+                if fragment.tag != 'fragment': continue
+                content = fragment.get('content')
+                if content != None:
+                    result += content
+                else:
+                    result += ''.join(_IB_string_element_text(s) for s in fragment if s.get('key') == 'content')
+            return result
+    return None
+
+def _IB_string_element_text(element):
+    
+    # Returns the text of a `<string>` element, which might be base64 encoded.
+    
+    result = element.text or ''
+    if element.get('base64-UTF8') == 'YES':
+        result = ''.join(result.split())
+        result = base64.b64decode(result + '=' * (-len(result) % 4)).decode('utf-8')
+    return result
+
+#
+# Extraction cache
+#
+
+# Notes:
+# - Git blobs are immutable, so the result of extracting / parsing any file content can be cached forever. 
+#     We store these results on disk in an SQLite database, keyed by the git blob SHA of the content plus the version of the extractor.
+#     The cache is shared between StateOfLocalization and UpdateStrings, and the GitHub Action keeps it between runs, so the daily run only pays for content it hasn't seen before.
+# - !! Bump the version in `extractor_versions` when you change the output of an extractor. Otherwise the cache will keep returning the old results. !!
+
+extraction_cache_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), '.cache', 'extraction_cache.sqlite3') # Localization/Code/.cache/. If you move this, update .gitignore and the GitHub Actions.
+extraction_cache_enabled = True
+
+extractor_versions = {
+    'keys_and_values':              1, # extract_translation_keys_and_values_from_string()
+    'IB_strings':                   1, # extract_strings_from_IB_content()
+    'IB_strings_ibtool':            1, # extract_strings_from_IB_content() with the 'ibtool' backend
+    'stringsdict_keys_and_values':  1, # extract_translation_keys_and_values_from_stringsdict()
+}
+
+_extraction_cache_connection = None
+_extraction_cache_connection_pid = None # The connection can't be shared with forked processes
+_extraction_cache_pending = dict() # Results that haven't been written to the cache yet. See flush_extraction_cache()
+extraction_cache_flush_threshold = 1000 # Write the pending results once there are this many, so they don't pile up in memory over a long run
+
+def cached_extraction(extractor_name, content, extract):
+    
+    """
+    Returns `extract(content)`. Looks up the result in the extraction cache first, and stores it there if it's not found.
+        The result of `extract` needs to be json-serializable.
+        `content` can be bytes or str.
+        Every call returns a fresh copy, so callers can modify the result without changing what's cached.
+    """
+    
+    if not extraction_cache_enabled:
+        return extract(content)
+    
+    connection = _get_extraction_cache_connection()
+    cache_key = git_blob_sha(content)
+    version = extractor_versions[extractor_name]
+    
+    pending_result = _extraction_cache_pending.get((extractor_name, version, cache_key), None)
+    if pending_result != None:
+        return json.loads(pending_result)
+    
+    row = connection.execute("SELECT result FROM extraction_cache WHERE extractor = ? AND version = ? AND blob_sha = ?", (extractor_name, version, cache_key)).fetchone()
+    if row != None:
+        return json.loads(row[0])
+    
+    result = json.dumps(extract(content), ensure_ascii=False)
+    _extraction_cache_pending[(extractor_name, version, cache_key)] = result
+    if len(_extraction_cache_pending) >= extraction_cache_flush_threshold:
+        flush_extraction_cache()
+    
+    return json.loads(result)
+
+def flush_extraction_cache():
+    
+    """
+    Writes the results that cached_extraction() has collected to the cache on disk. 
+        This happens automatically when the script exits, and whenever `extraction_cache_flush_threshold` results are pending. But processes from a multiprocessing pool exit without running atexit handlers, so they need to call this themselves.
+    
+    Notes: 
+    - We collect the results in memory and write them in batches, instead of inserting them right away. 
+        That way we only hold the write lock of the database for a moment, and several processes can use the cache at the same time without 'database is locked' errors.
+    """
+    
+    if len(_extraction_cache_pending) == 0:
+        return
+    
+    connection = _get_extraction_cache_connection()
+    connection.executemany("INSERT OR REPLACE INTO extraction_cache (extractor, version, blob_sha, result) VALUES (?, ?, ?, ?)", [(*key, result) for key, result in _extraction_cache_pending.items()])
+    connection.commit()
+    _extraction_cache_pending.clear()
+
+def git_blob_sha(content):
+    
+    # Returns the SHA that git would give a blob with this content. (Same as `git hash-object`)
+    #   Note: If you pass in a str that was decoded with universal newlines (e.g. by `subprocess.run(text=True)`) the result might differ from the SHA of the blob in the repo, but it's still a fine cache key.
+    
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+def clear_extraction_cache():
+    
+    global _extraction_cache_connection
+    if _extraction_cache_connection != None and _extraction_cache_connection_pid == os.getpid():
+        _extraction_cache_connection.close()
+    _extraction_cache_connection = None
+    _extraction_cache_pending.clear()
+    if os.path.exists(extraction_cache_path):
+        os.remove(extraction_cache_path)
+
+def _get_extraction_cache_connection():
+    
+    global _extraction_cache_connection, _extraction_cache_connection_pid
+    
+    if _extraction_cache_connection == None or _extraction_cache_connection_pid != os.getpid():
+        
+        # Open db
+        os.makedirs(os.path.dirname(extraction_cache_path), exist_ok=True)
+        connection = sqlite3.connect(extraction_cache_path, timeout=60) # Wait for other processes that are writing to the cache
+        connection.execute("PRAGMA journal_mode = WAL")     # So several processes can use the cache at the same time
+        connection.execute("PRAGMA synchronous = NORMAL")   # It's just a cache, we don't need to fsync every write
+        connection.execute("CREATE TABLE IF NOT EXISTS extraction_cache (extractor TEXT, version INTEGER, blob_sha TEXT, result TEXT, PRIMARY KEY (extractor, version, blob_sha))")
+        
+        # Remove results of outdated extractor versions
+        for extractor_name, version in extractor_versions.items():
+            connection.execute("DELETE FROM extraction_cache WHERE extractor = ? AND version != ?", (extractor_name, version))
+        connection.commit()
+        
+        # Write to disk when the script exits
+        #   (Committing after every insert is slow)
+        if _extraction_cache_connection_pid == None:
+            atexit.register(_close_extraction_cache_connection)
+        
+        _extraction_cache_connection = connection
+        _extraction_cache_connection_pid = os.getpid()
+    
+    return _extraction_cache_connection
+
+def _close_extraction_cache_connection():
+    
+    global _extraction_cache_connection
+    if _extraction_cache_connection != None and _extraction_cache_connection_pid == os.getpid():
+        flush_extraction_cache()
+        _extraction_cache_connection.close()
+        _extraction_cache_connection = None
+
+#
+# Analysis helpers
+#
+
+def extract_strings_from_IB_file_with_ibtool(ib_file_path):
+    
     # Check if empty
     #   If ib_file is empty, ibtool will return errors, but we just want to return an empty file instead of errors.
     if is_file_empty(ib_file_path):
-        return temp_file_path
+        return ''
     
     # Run ibtool
-    cltResult = subprocess.run(f"/usr/bin/ibtool --export-strings-file {temp_file_path} {ib_file_path}", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    #   ibtool can only write to a file, so we give it a temp folder
+    with tempfile.TemporaryDirectory() as temp_dir:
+        
+        output_path = os.path.join(temp_dir, 'output.strings')
+        cltResult = subprocess.run(['/usr/bin/ibtool', '--export-strings-file', output_path, ib_file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            
+        if len(cltResult.stdout) > 0 or len(cltResult.stderr) > 0:
+            # Log & Crash
+            print(f"Error: ibtool failed. ib_file: {ib_file_path}, printing feedback ... \nstdout: {cltResult.stdout}\nstderr: {cltResult.stderr}")
+            exit(1)
         
-    if len(cltResult.stdout) > 0 or len(cltResult.stderr) > 0:
-        # Log & Crash
-        print(f"Error: ibtool failed. temp_file: {temp_file_path}, ib_file: {ib_file_path}, printing feedback ... \nstdout: {cltResult.stdout}\nstderr: {cltResult.stderr}")
-        exit(1)
+        with open(output_path, 'rb') as file:
+            output = file.read()
     
-    # Convert to utf-8
-    #   For some reason, ibtool outputs strings files as utf-16, even though strings files in Xcode are utf-8 and also git doesn't understand utf-8.
-    convert_utf16_file_to_utf8(temp_file_path)
+    # Decode
+    #   For some reason, ibtool outputs strings files as utf-16, even though strings files in Xcode are utf-8 and also git doesn't understand utf-16.
+    return decode_text(output)
+
+def decode_text(data):
     
-    # Return
-    return temp_file_path
+    """
+    Decodes bytes from files or command line tools. Handles utf-16 (which ibtool and extractLocStrings output) by looking at the byte order mark, otherwise assumes utf-8.
+    """
+    
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        return data.decode('utf-16')
+    if data.startswith(codecs.BOM_UTF8):
+        return data.decode('utf-8-sig')
+    return data.decode('utf-8')
 
-def read_file(file_path, encoding='utf-8'):
+def git_show(repo_root, rev, path):
     
-    result = ''
-    with open(file_path, 'r', encoding=encoding) as temp_file:
-        result = temp_file.read()
+    """
+    Returns the content of the file at `path` at commit `rev` as bytes. (Like `git show <rev>:<path>` but without decoding.)
+        Note: `path` has to be relative to the repo root.
+    """
+    
+    result = get_git_object_reader(repo_root).read(rev, path)
+    assert result != None, f"git show failed. {rev}:{path} doesn't exist in {repo_root}"
     
     return result
+
+class GitObjectReader:
     
+    """
+    Keeps one `git cat-file --batch` process open and reads git objects through its pipe.
+        Spawning a bash and a git process for every `git show` call dominated the runtime of StateOfLocalization, since we look at every version of every localization file.
+        Use get_git_object_reader() instead of creating these directly, so there's only one process per repository.
+    """
+    
+    def __init__(self, repo_root):
+        self.repo_root = repo_root
+        self.pid = os.getpid() # The pipes can't be shared with forked processes
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_root, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    
+    def read(self, rev, path=None):
+        
+        # Returns the content of `<rev>:<path>` (or of the object `rev` if `path` is None) as bytes. Returns None if the object doesn't exist.
+        
+        object_info = self.read_object(f'{rev}:{path}' if path != None else rev)
+        return object_info['content'] if object_info != None else None
+    
+    def read_object(self, object_name):
+        
+        """
+        Returns None if the object doesn't exist. Otherwise returns:
+        {
+            "sha": <object_sha>,
+            "type": <"blob" | "tree" | "commit" | "tag">,
+            "content": <bytes>,
+        }
+        """
+        
+        assert '\n' not in object_name, f"Object names can't contain linebreaks: {repr(object_name)}"
+        
+        # Request object
+        self.process.stdin.write(object_name.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        
+        # Read header
+        #   Format: `<sha> <type> <size>\n` or `<object_name> missing\n` (or `ambiguous`)
+        header = self.process.stdout.readline()
+        assert len(header) > 0, f"git cat-file process in {self.repo_root} exited unexpectedly"
+        header_fields = header.split()
+        if len(header_fields) != 3 or header_fields[-1] in [b'missing', b'ambiguous']:
+            return None
+        
+        # Read content
+        sha, type, size = header_fields
+        content = self.process.stdout.read(int(size))
+        self.process.stdout.read(1) # Skip the trailing linebreak
+        
+        return { "sha": sha.decode('utf-8'), "type": type.decode('utf-8'), "content": content }
+    
+    def close(self):
+        if self.process.poll() == None:
+            self.process.stdin.close()
+            self.process.wait()
 
-def read_tempfile(temp_file_path, remove=True):
+_git_object_readers = dict()
+
+def get_git_object_reader(repo_root):
+    
+    # Returns the GitObjectReader for the repo at `repo_root`. Creates it if necessary.
+    
+    key = os.path.realpath(repo_root)
+    reader = _git_object_readers.get(key, None)
+    
+    if reader == None or reader.pid != os.getpid():
+        if len(_git_object_readers) == 0:
+            atexit.register(close_git_object_readers)
+        reader = GitObjectReader(key)
+        _git_object_readers[key] = reader
     
-    result = read_file(temp_file_path)
+    return reader
+
+def close_git_object_readers():
+    for reader in _git_object_readers.values():
+        if reader.pid == os.getpid():
+            reader.close()
+    _git_object_readers.clear()
+
+def read_file(file_path, encoding='utf-8'):
     
-    if remove:
-        os.remove(temp_file_path)
+    result = ''
+    with open(file_path, 'r', encoding=encoding) as temp_file:
+        result = temp_file.read()
     
     return result
+    
 
 def write_file(file_path, content, encoding='utf-8'):
     with open(file_path, 'w', encoding=encoding) as file:
         file.write(content)
 
-def convert_utf16_file_to_utf8(file_path):
-    
-    content = read_file(file_path, 'utf-16')
-    write_file(file_path, content, encoding='utf-8')
-
 def is_file_empty(file_path):
     """Check if file is empty by confirming if its size is 0 bytes.
         Also returns true if the file doesn't exist."""
@@ -271,6 +986,60 @@ def run_git_command(repo_path, command):
 
     return stdout.decode('utf-8')
 
+def iter_command_output(command, cwd=None, separator='\n', keep_separator=False, encoding='utf-8', success_codes=[0]):
+    
+    """
+    Runs `command` and yields its stdout split at `separator`, while the command is still running. 
+        runCLT() and run_git_command() wait for the command to exit and hold the whole output in memory. For commands that go through the entire git history, use this instead.
+    
+    - `command` is a list of arguments. (Or a string, which is run by bash, like in runCLT())
+    - Records are decoded with `encoding` as they arrive. With `keep_separator`, each record still ends in `separator` (except maybe the last one), so joining them gives back the original output.
+    - Raises an Exception with the stderr of the command if it exits with a code that isn't in `success_codes`. 
+        Since we're a generator, that only happens once you've consumed all the records. If you stop early, the command is killed.
+    """
+    
+    # Notes: 
+    # - We write stderr to a temp file, so the command can't block on a full stderr pipe while we're reading stdout.
+    
+    with tempfile.TemporaryFile() as stderr_file:
+        
+        process = subprocess.Popen(command, cwd=cwd, shell=isinstance(command, str), executable=('/bin/bash' if isinstance(command, str) else None), stdout=subprocess.PIPE, stderr=stderr_file)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        buffer = ''
+        
+        try:
+            
+            # Read records
+            while True:
+                chunk = process.stdout.read1(65536)
+                buffer += decoder.decode(chunk, final=(len(chunk) == 0))
+                
+                records = buffer.split(separator)
+                buffer = records.pop()
+                for record in records:
+                    yield record + separator if keep_separator else record
+                
+                if len(chunk) == 0:
+                    break
+            
+            if len(buffer) > 0:
+                yield buffer
+            
+            # Check errors
+            returncode = process.wait()
+            if returncode not in success_codes:
+                stderr_file.seek(0)
+                raise Exception(f"Command {command} failed with code {returncode}, run in cwd \"{cwd}\"\n--- stderr:\n{stderr_file.read().decode('utf-8', errors='replace')}")
+        
+        finally:
+            
+            # Clean up
+            #   If the caller stopped early, we end up here with the command still running
+            if process.poll() == None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
 #
 # Debug Helpers
 #
@@ -322,21 +1091,72 @@ def indent(s, indent_spaces=2):
 def find_files_with_extensions(exts, excluded_paths):
     
     """
+    Returns paths (relative to the current working directory, starting with `./`) of all files with one of the extensions `exts`. Paths that contain any of the `excluded_paths` substrings are skipped.
+        Results are grouped by extension, in the order of `exts`. Like glob, we skip hidden files and folders.
+    
     We used to use a neat glob pattern in our subprocess call `./**/*.{m,c,cpp,mm,swift}`, but that also caught python package .c files, and idk how to exclude them.
         The .c files didn't actually cause obvious problems (because they don't contain NSLocalizedString() macros anyways) but I hope this will make things a bit faster.
         (Didn't test if it's actually faster)
+    
+    Update: After that, we ran one recursive glob per extension, which walked the whole working tree including venvs and build products once per extension. 
+        Now we get the candidate files from `git ls-files` (tracked files plus untracked files that aren't gitignored) and match all extensions in one pass. 
+        If we're not inside a git repo, we fall back to a single walk of the working tree.
     """
     
+    # Get candidate files
+    candidates = _list_files_with_git()
+    if candidates == None:
+        candidates = _list_files_with_walk(excluded_paths)
+    
+    # Match extensions
+    paths_by_ext = { ext: [] for ext in exts }
+    for path in candidates:
+        _, extension = os.path.splitext(path)
+        ext = extension[1:]
+        if ext not in paths_by_ext: continue
+        if any(component.startswith('.') for component in path.split('/')[1:]): continue # Skip hidden files and folders
+        if any(exc in path for exc in excluded_paths): continue
+        paths_by_ext[ext].append(path)
+    
+    # Flatten
     paths = []
     for ext in exts:
-        pattern = f'./**/*.{ext}'
-        f = glob.glob(pattern, recursive=True)
-        ff = [path for path in f if not any(exc in path for exc in excluded_paths)]
-        paths += ff
+        paths += paths_by_ext[ext]
     
     # Return
     return paths
 
+def _list_files_with_git():
+    
+    # Returns the paths of all files in the working tree under the current working directory that aren't gitignored. Returns None if we're not inside a git repo.
+    #   Note: `--recurse-submodules` lists the files of submodules, like the glob did. But git only supports it together with `--cached`, so we list the untracked files in a separate call. (Untracked files inside submodules are missed.)
+    
+    paths = []
+    for args in [['--cached', '--recurse-submodules'], ['--others', '--exclude-standard']]:
+        clt_result = subprocess.run(['git', 'ls-files', '-z', *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if clt_result.returncode != 0:
+            return None
+        paths += clt_result.stdout.decode('utf-8').split('\0')
+    
+    result = []
+    for path in paths:
+        if len(path) == 0: continue
+        path = './' + path
+        if os.path.isfile(path): # Files that are deleted in the working tree are still listed with --cached
+            result.append(path)
+    
+    return result
+
+def _list_files_with_walk(excluded_paths):
+    
+    # Returns the paths of all files in the working tree under the current working directory. Doesn't go into hidden folders or into folders that contain any of the `excluded_paths` substrings.
+    
+    result = []
+    for root, dirs, files in walk_directory_tree('.'):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and not any(exc in root + '/' + d + '/' for exc in excluded_paths)]
+        result += [root + '/' + f for f in files]
+    
+    return result
 
 def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'strings', 'stringsdict', 'gh-markdown', 'nuxt']):
     
@@ -373,11 +1193,9 @@ def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'stri
     assert len(basetypes) > 0
     if 'nuxt' in basetypes: assert website_root
     
-    # Constants
-    
-    markdown_dir = repo_root + '/' + "Markdown/Templates"
-    exclude_paths_relative = ["Frameworks/Sparkle.framework"]
-    exclude_paths = list(map(lambda exc: repo_root + '/' + exc, exclude_paths_relative))
+    # Get index
+    #   Contains all the folders we're interested in. This way we only have to walk the file system once, instead of once for every base file.
+    index = get_localization_file_index(repo_root, website_root)
     
     # Get repos
     mmf_repo = git.Repo(repo_root)
@@ -394,7 +1212,7 @@ def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'stri
     
     # Append markdown base_files
     if 'gh-markdown' in basetypes:
-        for root, dirs, files in os.walk(markdown_dir):
+        for root, files in index['markdown_dirs']:
             is_en_folder = 'en-US' in os.path.basename(root)
             if is_en_folder:
                 files_absolute = map(lambda file: root + '/' + file, files)
@@ -406,10 +1224,9 @@ def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'stri
                     result.append({ 'base': b, 'repo': mmf_repo, 'basetype': 'gh-markdown' })
         
     # Append Xcode base files 
-    #   Note: We do this last because in the analysis we iterate through the `result` dict in insertion order, and analyzing the IB stuff is the slowest. So doing this last makes debugging more convenient.
+    #   Note: We do this last because in the analysis we iterate through the `result` dict in insertion order, and analyzing the IB stuff is the slowest. So doing this last makes debugging more convenient. (With `--jobs`, the analysis reorders the base files anyway, so that the slowest ones start first. See estimated_analysis_costs() in the StateOfLocalization script.)
     if set(['IB', 'strings', 'stringsdict']) & set(basetypes):
-        for root, dirs, files in os.walk(repo_root):
-            dirs[:] = [d for d in dirs if root + '/' + d not in exclude_paths]
+        for root, files in index['lproj_dirs'].items():
             is_en_folder = 'en.lproj' in os.path.basename(root)
             is_base_folder = 'Base.lproj' in os.path.basename(root)
             if is_base_folder or is_en_folder:
@@ -443,19 +1260,22 @@ def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'stri
         else:
             translation_root = os.path.dirname(os.path.dirname(base_path)) # Grandparent of basefile
         
-        for root, dirs, files in os.walk(translation_root):
-            
-            # print(f"Finding translations in translation root {translation_root} --- root: {root}, dirs: {dirs}, files: {files}")
-            
-            if basetype in ['IB', 'strings', 'stringsdict']:
-                
-                # Don't go into folders other than `.lproj`
-                dirs[:] = [d for d in dirs if '.lproj' in d]
-                
-                # Only process files inside `.lproj` folders
-                if not '.lproj' in os.path.basename(root):
-                    continue
+        # Get folders that can contain translation files
+        #   Note: For Xcode files, we only look inside `.lproj` folders
+        if basetype in ['IB', 'strings', 'stringsdict']:
+            translation_dirs = []
+            def append_lproj_dirs(parent):
+                for d in index['lproj_subdirs'].get(parent, []):
+                    translation_dirs.append((d, index['lproj_dirs'][d]))
+                    append_lproj_dirs(d)
+            append_lproj_dirs(translation_root)
+        else:
+            dirs = index['nuxt_dirs'] if basetype == 'nuxt' else index['markdown_dirs']
+            translation_dirs = [(root, files) for root, files in dirs if root == translation_root or root.startswith(translation_root + '/')]
+        
+        for root, files in translation_dirs:
             
+            # print(f"Finding translations in translation root {translation_root} --- root: {root}, files: {files}")
             
             # Process files
             for f in files:
@@ -519,3 +1339,87 @@ def find_localization_files(repo_root, website_root=None, basetypes=['IB', 'stri
         e['translations'] = translations
     
     return result
+
+_localization_file_indexes = dict()
+
+def get_localization_file_index(repo_root, website_root=None):
+    
+    """
+    Walks the repos once with os.scandir() and returns an index of the folders that find_localization_files() looks at.
+        The index is reused between calls, e.g. when UpdateStrings calls find_localization_files() for IB files and for strings files. 
+        Call clear_localization_file_indexes() if you add or remove localization files in between.
+    
+    Structure of the result:
+    {
+        "lproj_dirs": { "<dir_path>": ["<file_name>", ...], ... },      # Every folder whose name contains `.lproj`, in os.walk() order
+        "lproj_subdirs": { "<dir_path>": ["<lproj_dir_path>", ...] },   # The `.lproj` folders directly inside each folder
+        "markdown_dirs": [ ("<dir_path>", ["<file_name>", ...]), ... ], # Markdown/Templates and all folders inside it, in os.walk() order
+        "nuxt_dirs": [ ("<dir_path>", ["<file_name>", ...]), ... ],     # The website's locales folder and all folders inside it, in os.walk() order
+    }
+    """
+    
+    # Check cache
+    cache_key = (repo_root, website_root)
+    if cache_key in _localization_file_indexes:
+        return _localization_file_indexes[cache_key]
+    
+    # Constants
+    
+    markdown_dir = repo_root + '/' + "Markdown/Templates"
+    exclude_paths_relative = [".git", "Frameworks/Sparkle.framework"]
+    exclude_paths = list(map(lambda exc: repo_root + '/' + exc, exclude_paths_relative))
+    
+    # Walk mmf repo
+    
+    result = { 'lproj_dirs': dict(), 'lproj_subdirs': dict(), 'markdown_dirs': [], 'nuxt_dirs': [] }
+    
+    for root, dirs, files in walk_directory_tree(repo_root, exclude_paths):
+        if '.lproj' in os.path.basename(root):
+            result['lproj_dirs'][root] = files
+        lproj_subdirs = [root + '/' + d for d in dirs if '.lproj' in d and root + '/' + d not in exclude_paths]
+        if len(lproj_subdirs) > 0:
+            result['lproj_subdirs'][root] = lproj_subdirs
+        if root == markdown_dir or root.startswith(markdown_dir + '/'):
+            result['markdown_dirs'].append((root, files))
+    
+    # Walk website locales
+    
+    if website_root:
+        for root, dirs, files in walk_directory_tree(website_root + '/' + 'locales'):
+            result['nuxt_dirs'].append((root, files))
+    
+    # Store & return
+    _localization_file_indexes[cache_key] = result
+    return result
+
+def clear_localization_file_indexes():
+    _localization_file_indexes.clear()
+
+def walk_directory_tree(root, exclude_paths=[]):
+    
+    # Like os.walk(root), but skips the folders at `exclude_paths`. Yields (<dir_path>, <subdir_names>, <file_names>) top-down.
+    
+    stack = [root]
+    while len(stack) > 0:
+        
+        dir_path = stack.pop()
+        
+        dirs = []
+        files = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            continue
+        
+        yield dir_path, dirs, files # The caller can remove items from `dirs` to skip them, like with os.walk()
+        
+        # Push subfolders in reverse, so they're walked in order
+        for d in reversed(dirs):
+            path = dir_path + '/' + d
+            if path not in exclude_paths and not os.path.islink(path):
+                stack.append(path)
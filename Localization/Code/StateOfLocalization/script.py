@@ -28,6 +28,11 @@ import argparse
 import textwrap
 from datetime import datetime
 import sys
+import json
+import sqlite3
+import itertools
+import multiprocessing
+import time
 
 #
 # Package imports
@@ -50,6 +55,8 @@ from Shared import shared
 # Constants
 #
 
+key_analysis_file_types = ['.js', '.strings', '.stringsdict', '.xib', '.storyboard'] # We analyze changes to the individual kv-pairs for these file types. For other file types (.md) we only analyze 'outdating commits' for the whole file.
+
 language_flag_fallback_map = { # When a translation's languageID doesn't contain a country, fallback to these flags
     'zh': '🇨🇳',       # Chinese maps to China
     'ko': '🇰🇷',       # Korean maps to South Korea
@@ -57,6 +64,11 @@ language_flag_fallback_map = { # When a translation's languageID doesn't contain
     'vi': '🇻🇳',       # Vietnamese maps to Vietnam
 }
 
+history_engine = 'index'                # See the `--history_engine` arg
+rebuild_key_history_index = False       # See the `--rebuild_index` arg
+analysis_jobs = 1                       # See the `--jobs` arg
+print_analysis_stats_count = 0          # See the `--print_analysis_stats` arg
+
 #
 # Main
 #
@@ -66,18 +78,59 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--api_key', required=False, help="If no API key is supplied, the result will be printed to the console instead of uploaded to GitHub || To find the API key, see Apple Note 'MMF Localization Script Access Token'")
     parser.add_argument('--print_latest_for', required=False, help="Debugging tool. Print the latest changes for each key for each translation file whose path contains this value.")
+    parser.add_argument('--no_cache', required=False, action='store_true', help="Don't read or write the extraction cache. (See shared.cached_extraction())", default=False)
+    parser.add_argument('--ib_backend', required=False, choices=['python', 'ibtool'], default=shared.IB_strings_extraction_backend, help="How to extract the strings from IB files. 'ibtool' only works on macOS with Xcode installed. (See shared.extract_strings_from_IB_content())")
+    parser.add_argument('--history_engine', required=False, choices=['index', 'log', 'per_file', 'blame'], default='index', help="How to find the latest change for each translation key. 'index' only scans the commits since the last run and takes the rest from the key history index (See get_latest_changes_from_index()). 'log' scans the history of all files in a single `git log` (See get_latest_changes_for_files()). 'per_file' runs `git log` and `git diff` for each file separately (See get_latest_change_for_translation_keys()). 'blame' runs `git blame` for each file (See get_latest_change_for_translation_keys_with_blame()). All should give the same results, except for some edge cases with 'blame'.")
+    parser.add_argument('--rebuild_index', required=False, action='store_true', help="Rebuild the key history index from scratch instead of only scanning the commits since the last run.", default=False)
+    parser.add_argument('--jobs', required=False, type=int, default=1, help="Number of processes for analyzing the translation keys of the base files in parallel. Only used if the analysis is estimated to take longer than starting the processes. (See analyze_translation_keys_in_parallel())")
+    parser.add_argument('--print_analysis_stats', required=False, type=int, nargs='?', const=20, default=0, metavar='COUNT', help="Print the analysis jobs that took the longest. (See print_analysis_stats())")
+    parser.add_argument('--shard', required=False, type=parse_shard_arg, metavar='I/N', help="Only analyze the languages in shard I of N (1-based) and write the partial result to --shard_output instead of uploading. Combine the partial results with --merge_shards. (See shard_language_ids())")
+    parser.add_argument('--shard_output', required=False, help="Where to write the partial result of a --shard run. Defaults to Localization/Code/.cache/state_of_localization_shard_I_of_N.json")
+    parser.add_argument('--merge_shards', required=False, nargs='+', metavar='PATH', help="Build the markdown from the partial results of all the --shard runs instead of analyzing the repos. The result is uploaded or printed as usual. (See markdown_from_shard_results())")
     args = parser.parse_args()
-
-
-    repo_root = os.getcwd()
-    website_root = repo_root + '/' + "../mac-mouse-fix-website"
-    assert os.path.basename(repo_root) == 'mac-mouse-fix', "Run this script from the 'mac-mouse-fix' repo folder."
-    assert os.path.exists(website_root), "Couldn't find mmf website repo at {website_root}"
     
-    files = shared.find_localization_files(repo_root, website_root)
-    missing_analysis = analyze_missing_localization_files(files)
-    analysis = analyze_localization_files(files, args.print_latest_for)
-    markdown = markdown_from_analysis(analysis, missing_analysis)
+    if args.no_cache:
+        shared.extraction_cache_enabled = False
+    shared.IB_strings_extraction_backend = args.ib_backend
+    
+    global history_engine, rebuild_key_history_index, analysis_jobs, print_analysis_stats_count
+    history_engine = args.history_engine
+    rebuild_key_history_index = args.rebuild_index
+    analysis_jobs = args.jobs
+    print_analysis_stats_count = args.print_analysis_stats
+    
+    if args.shard and args.merge_shards:
+        parser.error("--shard and --merge_shards can't be used together.")
+    
+    if args.merge_shards:
+        
+        # Merge the partial results
+        #   Doesn't need the repos
+        markdown = markdown_from_shard_results(args.merge_shards)
+        
+    else:
+
+        repo_root = os.getcwd()
+        website_root = repo_root + '/' + "../mac-mouse-fix-website"
+        assert os.path.basename(repo_root) == 'mac-mouse-fix', "Run this script from the 'mac-mouse-fix' repo folder."
+        assert os.path.exists(website_root), "Couldn't find mmf website repo at {website_root}"
+        
+        files = shared.find_localization_files(repo_root, website_root)
+        missing_analysis = analyze_missing_localization_files(files)
+        
+        if args.shard:
+            
+            # Only analyze the languages of this shard, and write a partial result
+            shard, shard_count = args.shard
+            language_ids = shard_language_ids(files, shard, shard_count)
+            missing_analysis = { language_id: d for language_id, d in missing_analysis.items() if language_id in language_ids }
+            analysis = analyze_localization_files(files, args.print_latest_for, language_ids=language_ids)
+            shard_output = args.shard_output or os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), '.cache', f'state_of_localization_shard_{shard}_of_{shard_count}.json')
+            write_shard_result(shard_output, shard, shard_count, files, markdown_sections_from_analysis(analysis, missing_analysis))
+            return
+        
+        analysis = analyze_localization_files(files, args.print_latest_for)
+        markdown = markdown_from_analysis(analysis, missing_analysis)
     
     if args.api_key:
         upload_markdown(args.api_key, markdown)
@@ -114,6 +167,119 @@ def prepare_interactive_debugging(repo_root, website_root):
     
     return result
     
+#
+# Sharding
+#
+
+# Notes:
+# - The analysis of each language is independent of the other languages, and so is its section in the markdown. (See markdown_sections_from_analysis())
+#     So we can split the languages into shards, analyze each shard in a separate run (e.g. in parallel CI jobs), and then combine the sections into the markdown for the whole thing.
+# - Usage:
+#     1. Run `script.py --shard 1/3 --shard_output shard_1.json`, `script.py --shard 2/3 --shard_output shard_2.json`, ... on the same checkout of the repos.
+#     2. Run `script.py --merge_shards shard_1.json shard_2.json shard_3.json [--api_key ...]`. This gives the exact same markdown as a run without `--shard`.
+# - The languages are assigned round-robin in sorted order, so every run with the same repos and the same shard count gets the same shards. Languages have roughly the same amount of work, so the shards are about equally big.
+# - Each shard still scans the history of all the files in the 'index' engine, so that the key history index stays complete. That's fast after the first run. (See analyze_localization_files())
+# - The partial results store the HEAD commit of each repo, and merging fails if they don't match. Otherwise we could silently combine the analysis of different commits.
+
+shard_result_version = 1
+
+def parse_shard_arg(arg):
+    
+    # Parses the `--shard I/N` arg into (I, N)
+    
+    match = re.fullmatch(r'(\d+)/(\d+)', arg.strip())
+    if match == None:
+        raise argparse.ArgumentTypeError(f"Expected a shard like '2/4', got '{arg}'")
+    shard, shard_count = int(match.group(1)), int(match.group(2))
+    if not (1 <= shard <= shard_count):
+        raise argparse.ArgumentTypeError(f"Shard {shard} doesn't exist in {shard_count} shards. (Shards start at 1)")
+    
+    return shard, shard_count
+
+def all_language_ids(files):
+    return sorted(set(translation_dict['language_id'] for file_dict in files for translation_dict in file_dict['translations'].values()))
+
+def shard_language_ids(files, shard, shard_count):
+    
+    # Returns the language ids that belong to `shard` (1-based) out of `shard_count` shards. See the notes above.
+    
+    return set(language_id for i, language_id in enumerate(all_language_ids(files)) if i % shard_count == shard - 1)
+
+def shard_repo_heads(files):
+    # Maps each repo's folder name to its HEAD commit. (The absolute paths are different on every CI runner, so we use the folder names, like the key history index.)
+    return { os.path.basename(os.path.realpath(file_dict['repo'].working_tree_dir)): file_dict['repo'].head.commit.hexsha for file_dict in files }
+
+def write_shard_result(path, shard, shard_count, files, sections):
+    
+    """
+    Writes the partial result of a `--shard` run.
+    Structure:
+    {
+        'version': <shard_result_version>,
+        'shard': <I>,
+        'shard_count': <N>,
+        'heads': { '<repo_folder_name>': '<head_commit_hash>', ... },
+        'language_ids': [<all language ids of all shards>],
+        'shard_language_ids': [<language ids of this shard>],
+        'sections': { '<language_id>': '<markdown>', ... }  # Output of markdown_sections_from_analysis(). Languages without problems don't have a section.
+    }
+    """
+    
+    result = {
+        'version': shard_result_version,
+        'shard': shard,
+        'shard_count': shard_count,
+        'heads': shard_repo_heads(files),
+        'language_ids': all_language_ids(files),
+        'shard_language_ids': sorted(shard_language_ids(files, shard, shard_count)),
+        'sections': sections,
+    }
+    
+    # Write
+    #   Through a temp file, like the analysis stats
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2, sort_keys=True, ensure_ascii=False)
+    os.replace(temp_path, path)
+    
+    print(f"Wrote shard {shard}/{shard_count} with {len(result['shard_language_ids'])} languages to {path}")
+
+def markdown_from_shard_results(paths):
+    
+    # Combines the partial results of all the `--shard` runs into the markdown for the whole thing. Checks that the shards belong together and that none is missing.
+    
+    # Load
+    results = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            results.append(json.load(file))
+    
+    # Validate
+    first = results[0]
+    for path, result in zip(paths, results):
+        if result.get('version', None) != shard_result_version:
+            raise Exception(f"Shard result at {path} has version {result.get('version', None)}, expected {shard_result_version}. Rerun the shards with this version of the script.")
+        for field in ['shard_count', 'heads', 'language_ids']:
+            if result[field] != first[field]:
+                raise Exception(f"Shard result at {path} doesn't belong with the shard result at {paths[0]}. They have different '{field}': {result[field]} vs {first[field]}")
+    
+    shards = sorted(result['shard'] for result in results)
+    if shards != list(range(1, first['shard_count'] + 1)):
+        raise Exception(f"Expected exactly one result for each of the {first['shard_count']} shards, got shards {shards}")
+    
+    covered_language_ids = sorted(language_id for result in results for language_id in result['shard_language_ids'])
+    if covered_language_ids != first['language_ids']:
+        raise Exception(f"The shards don't cover each language exactly once. Expected {first['language_ids']}, got {covered_language_ids}")
+    
+    # Merge
+    sections = dict()
+    for result in results:
+        sections.update(result['sections'])
+    
+    # Build markdown
+    return markdown_from_sections(sections)
+
 #
 # Upload Markdown
 # 
@@ -277,8 +443,17 @@ def markdown_from_analysis(files, missing_files):
     To find unsorted iterations:
         Find for loops and list comprehensions by searching for 'for'. Also search for `map`. 
         Other ways to iterate dicts are `dict comprehensions` and `generator expressions`. But I don't think we'll ever use those.
+    
+    The markdown is built in two steps: markdown_sections_from_analysis() builds a section for each language, and markdown_from_sections() puts them together.
+        The sections of different languages are independent of each other, which is what lets us split the analysis into shards. (See `--shard`)
     """
     
+    return markdown_from_sections(markdown_sections_from_analysis(files, missing_files))
+
+def markdown_sections_from_analysis(files, missing_files):
+    
+    # Returns a dict that maps each language id to the markdown section for that language. Languages without any problems don't get a section. (See markdown_from_analysis())
+    
     # Log
     print("Generating markdown from analysis...")
     
@@ -303,7 +478,7 @@ def markdown_from_analysis(files, missing_files):
             
             content_str = ''
             
-            if file_type == '.md' or file_type == '.stringsdict':
+            if file_type == '.md':
                 
                 # Build user strings using outdating_commits
                 #   Since we don't analyze keys for these files
@@ -334,7 +509,7 @@ The base file changed after that:
 Maybe the translation should be updated to reflect the new changes to the base file.\
 """) # dedent stopped working all of a sudden. No idea why.
                     
-            elif file_type == '.js' or file_type == '.strings':
+            elif file_type == '.js' or file_type == '.strings' or file_type == '.stringsdict':
                 
                 # Build strings for missing/superfluous translations
                 
@@ -469,9 +644,9 @@ see **Updating Translation Files** at the top of the page.
             result_by_language.setdefault(language_id, []).insert(0, new)
             
     
-    # Build rrresult from result_by_language
+    # Build sections from result_by_language
     
-    rrresult = ''
+    sections = dict()
     
     for language_id in sorted(result_by_language.keys()):
         
@@ -483,11 +658,26 @@ see **Updating Translation Files** at the top of the page.
         flag_emoji = language_tag_to_flag_emoji(language_id)
 
         # Attach language header
-        rrresult += f"\n\n# {flag_emoji} {language_name} | {language_id}"    
+        section = f"\n\n# {flag_emoji} {language_name} | {language_id}"    
         
         # Attach file analysis
         for content_str in sorted(content_strs):
-            rrresult += content_str
+            section += content_str
+        
+        sections[language_id] = section
+    
+    return sections
+
+def markdown_from_sections(sections):
+    
+    # Puts together the sections from markdown_sections_from_analysis()
+    
+    # Build rrresult from sections
+    
+    rrresult = ''
+    
+    for language_id in sorted(sections.keys()):
+        rrresult += sections[language_id]
     
     if len(rrresult) == 0:
         rrresult = "All translations seem to be up-to-date at the moment! This comment will be updated if there are any translations that need updating."
@@ -524,6 +714,9 @@ def translation_value_to_markdown(value, file_type, escape=True):
     if escape:
         value = escape_for_markdown(value)
     
+    if file_type == '.stringsdict':
+        value = value.replace('\n', '\\n') # Values in .strings and .js files contain escaped linebreaks, but values in .stringsdict files contain actual linebreaks. Escape them so they display the same.
+    
     cutoff = 250
     
     quoted = ''
@@ -539,6 +732,8 @@ def translation_value_to_markdown(value, file_type, escape=True):
         result = f'"{quoted}"'
     elif file_type == '.js':
         result = f"'{quoted}'"
+    elif file_type == '.stringsdict':
+        result = quoted
     
     return result
 
@@ -551,6 +746,8 @@ def translation_to_markdown(key, value, file_type, escape_value=True):
         result = f'"`{key}`" = {value_str};'
     elif file_type == '.js':
         result = f"'`{key}`': {value_str},"
+    elif file_type == '.stringsdict':
+        result = f"`{key}`: {value_str}"
     else:
         assert False
     
@@ -691,9 +888,11 @@ def analyze_missing_localization_files(files):
     # Return
     return result
 
-def analyze_localization_files(files, print_latest_for):
+def analyze_localization_files(files, print_latest_for, language_ids=None):
 
     """
+    If `language_ids` is given, only the translations into these languages are analyzed and returned. (See `--shard`)
+    
     
     Notes on is_ok_count:
     
@@ -722,12 +921,12 @@ def analyze_localization_files(files, print_latest_for):
                     'outdated_translations': {
                         '<translation_key>': {
                             'latest_base_change': {
-                                "commit": git.Commit(<commit_of_lastest_change>),
+                                "commit": CommitRecord(<commit_of_lastest_change>),
                                 "before": { "text": "<ui_text>", "is_ok_count": <int> },
                                 "after": { "text": "<ui_text>", "is_ok_count": <int> },
                             },
                             'latest_translation_change': {
-                                "commit": git.Commit(<commit_of_lastest_change>),
+                                "commit": CommitRecord(<commit_of_lastest_change>),
                                 "before": { "text": "<ui_text>", "is_ok_count": <int> },
                                 "after": { "text": "<ui_text>", "is_ok_count": <int> },
                             }
@@ -738,7 +937,7 @@ def analyze_localization_files(files, print_latest_for):
                         ...
                     },
                     'outdating_commits': {
-                        'latest_translation_change': git.Commit(),
+                        'latest_translation_change': CommitRecord(),
                         'newer_base_changes': [<commits_to_base_file_after_the_latest_commit_to_translation_file>]
                     }
                 },
@@ -758,13 +957,17 @@ def analyze_localization_files(files, print_latest_for):
     """
             
     
-    files = files.copy()
+    all_files = files
+    if language_ids == None:
+        files = files.copy()
+    else:
+        files = [{ **file_dict, 'translations': { path: d for path, d in file_dict['translations'].items() if d['language_id'] in language_ids } } for file_dict in files]
     
     # Log
     print(f'Analyzing localization file content...')
     
     # Get 'outdating commits'
-    #   This is a more primitive method than analyzing the changes to translation keys. Should only be relevant for files that don't have translation keys
+    #   This is a more primitive method than analyzing the changes to translation keys. Only relevant for files that don't have translation keys
     
     print(f'  Analyzing outdating commits...')
     
@@ -773,16 +976,19 @@ def analyze_localization_files(files, print_latest_for):
         base_file = file_dict['base']
         repo = file_dict['repo']
         
+        # Skip
+        _, base_file_type = os.path.splitext(base_file)
+        if base_file_type in key_analysis_file_types:
+            continue
+        
         for translation_file, translation_dict in file_dict['translations'].items():
             
-            translation_change_iterator = iter_content_changes(translation_file, repo) # repo.iter_commits(paths=translation_file, **{'max-count': 1} ) # max-count is passed along to `git rev-list` command-line-arg
-            last_translation_change = next(translation_change_iterator)
+            last_translation_change = get_content_changes(translation_file, repo)[0]
             
             outdating_commits = []
             
-            base_change_iterator = iter_content_changes(base_file, repo) # repo.iter_commits(paths=translation_file)
-            
-            for base_change in base_change_iterator:
+            # Note: The content changes of the base file are only computed once and then shared between all its translations. (See get_commits_follow_renames())
+            for base_change in get_content_changes(base_file, repo):
                 if not is_predecessor_or_equal(base_change, last_translation_change):
                     outdating_commits.append(base_change)
                 else:
@@ -798,190 +1004,493 @@ def analyze_localization_files(files, print_latest_for):
     # Log
     print(f'  Analyzing changes to translation keys and values...')
     
-    # Analyze changes to translation keys
-    for file_dict in files:
+    # Scan the history of all files at once
+    #   See get_latest_changes_for_files()
+    
+    latest_changes = dict()
+    
+    if history_engine in ['index', 'log']:
         
-        # Get base file info
-        base_file_path = file_dict['base']
-        _, base_file_type = os.path.splitext(base_file_path)
+        files_by_repo = dict()
+        for file_dict in (all_files if history_engine == 'index' else files): # The index should always get all files of the repo. See get_latest_changes_from_index().
+            _, base_file_type = os.path.splitext(file_dict['base'])
+            if base_file_type in key_analysis_file_types:
+                repo_files = files_by_repo.setdefault(file_dict['repo'].working_tree_dir, (file_dict['repo'], []))[1]
+                repo_files.append(file_dict['base'])
+                repo_files.extend(file_dict['translations'].keys())
         
-        # Skip
-        if not (base_file_type == '.js' or base_file_type == '.strings' or base_file_type == '.xib' or base_file_type == '.storyboard'):
-            continue
+        for repo, repo_files in files_by_repo.values():
+            print(f'    Scanning history of {len(repo_files)} files in {repo.working_tree_dir}...')
+            if history_engine == 'index':
+                latest_changes.update(get_latest_changes_from_index(repo_files, repo, rebuild=rebuild_key_history_index))
+            else:
+                latest_changes.update(get_latest_changes_for_files(repo_files, repo))
+    
+    # Analyze changes to translation keys
+    #   For each base file separately. These are independent of each other, so with `--jobs` we spread them over several processes. (See analyze_translation_keys_in_parallel())
+    
+    key_analysis_files = [file_dict for file_dict in files if os.path.splitext(file_dict['base'])[1] in key_analysis_file_types and (language_ids == None or len(file_dict['translations']) > 0)]
+    
+    if analysis_jobs > 1:
+        timings = analyze_translation_keys_in_parallel(key_analysis_files, latest_changes, print_latest_for, analysis_jobs)
+    else:
+        timings = [analyze_translation_keys(file_dict, latest_changes, print_latest_for) for file_dict in key_analysis_files]
+    
+    # Remember how long each file took
+    #   Only needed for scheduling the `--jobs` and for `--print_analysis_stats`. See analysis_stats_path
+    if print_analysis_stats_count > 0 or analysis_jobs > 1:
+        record_analysis_timings(key_analysis_files, timings)
+    if print_analysis_stats_count > 0:
+        print_analysis_stats(print_analysis_stats_count)
+    
+    # Return
+    return files
+
+
+def analyze_translation_keys(file_dict, latest_changes, print_latest_for):
+    
+    """
+    Analyzes the translation keys of the base file in `file_dict` and of all its translations, and records the results in the translation dicts. (See analyze_localization_files() for the structure.)
+        `latest_changes` is the output of get_latest_changes_for_files() (or get_latest_changes_from_index()) for the base file and its translations. It's ignored by the engines that look at each file separately.
+    
+    Returns how long the analysis took, in the format that record_analysis_timings() expects:
+    { 'base': <seconds_for_the_base_file>, 'translations': { <translation_file_path>: <seconds>, ... } }
+    """
+    
+    # Start timing
+    timings = { 'base': 0.0, 'translations': dict() }
+    start_time = time.perf_counter()
+    
+    # Get base file info
+    base_file_path = file_dict['base']
+    _, base_file_type = os.path.splitext(base_file_path)
+    
+    # Log
+    print(f'    Processing base translation at {base_file_path}...')
+    
+    # Get repo
+    repo = file_dict['repo']
+    get_latest_changes_for_file = get_latest_change_for_translation_keys_with_blame if history_engine == 'blame' else get_latest_change_for_translation_keys # For the engines that look at each file separately
+    
+    # Get basefile kv-pairs
+    base_keys_and_values = shared.extract_translation_keys_and_values_from_file(file_dict['base'])
+    
+    # Get IB placeholders
+    # Note: 
+    #  In IB files we mark placeholders that will not be shown to the user and don't need to be translated by surrounding them with <angle brackets>.
+    #  This code makes it so the analysis ignores these placeholders
+    ib_placeholders = dict()
+    if base_file_type == '.xib' or base_file_type == '.storyboard':
+        for key, value in base_keys_and_values.items():
+            text = value['value']['text']
+            if len(text) >= 2 and text[0] == '<' and text[-1] == '>':
+                ib_placeholders[key] = value
+    
+    # Remove IB placeholders from main kv-pairs
+    for k in ib_placeholders.keys():
+        base_keys_and_values.pop(k, 'None')
+    
+    # Extract keys from kv-pairs
+    if base_keys_and_values == None: return timings
+    base_keys = set(base_keys_and_values.keys())
+    
+    # For each key in the base file, get the commit, when it last changed
+    #   For the engines that look at each file separately, we do this for each translation instead. See below.
+    latest_base_changes = latest_changes[base_file_path] if history_engine in ['index', 'log'] else None
+    
+    # Debug
+    # if "LicenseSheetController" in base_file_path:
+    #     print(f"Licensesheet latest changes - {latest_base_changes}")
+    
+    # Record timing
+    timings['base'] = time.perf_counter() - start_time
+    
+    # Iterate translations
+    for translation_file_path, translation_dict in file_dict['translations'].items():
+        
+        # Start timing
+        translation_start_time = time.perf_counter()
         
         # Log
-        print(f'    Processing base translation at {base_file_path}...')
+        print(f'      Processing translation of {os.path.basename(base_file_path)} at {translation_file_path}...')
+        print(f'        Find translation keys and values...')
         
-        # Get repo
-        repo = file_dict['repo']
+        # Find kv-pairs in translation file
+        translation_keys_and_values = shared.extract_translation_keys_and_values_from_file(translation_file_path)
         
-        # Get basefile kv-pairs
-        base_keys_and_values = shared.extract_translation_keys_and_values_from_file(file_dict['base'])
-        
-        # Get IB placeholders
-        # Note: 
-        #  In IB files we mark placeholders that will not be shown to the user and don't need to be translated by surrounding them with <angle brackets>.
-        #  This code makes it so the analysis ignores these placeholders
-        ib_placeholders = dict()
-        if base_file_type == '.xib' or base_file_type == '.storyboard':
-            for key, value in base_keys_and_values.items():
-                text = value['value']['text']
-                if len(text) >= 2 and text[0] == '<' and text[-1] == '>':
-                    ib_placeholders[key] = value
-        
-        # Remove IB placeholders from main kv-pairs
+        # Remove IB placeholders
         for k in ib_placeholders.keys():
-            base_keys_and_values.pop(k, 'None')
+            translation_keys_and_values.pop(k, 'None')
         
-        # Extract keys from kv-pairs
-        if base_keys_and_values == None: continue
-        base_keys = set(base_keys_and_values.keys())
+        # Extract keys from kv_pairs
+        translation_keys = set(translation_keys_and_values.keys())
         
-        # For each key in the base file, get the commit, when it last changed
-        latest_base_changes = get_latest_change_for_translation_keys(base_keys, base_file_path, repo)      
+        # Get the keys the translation should have
+        #   Maps each key to the base key it translates. Usually these are the same, but for .stringsdict files, the plural categories depend on the language.
+        expected_keys, optional_keys = expected_translation_keys(base_keys, base_file_type, translation_dict['language_id'])
         
-        # Debug
-        # if "LicenseSheetController" in base_file_path:
-        #     print(f"Licensesheet latest changes - {latest_base_changes}")
+        print(f'        Check missing/superfluous keys...')
         
-        # Iterate translations
-        for translation_file_path, translation_dict in file_dict['translations'].items():
-            
-            # Log
-            print(f'      Processing translation of {os.path.basename(base_file_path)} at {translation_file_path}...')
-            print(f'        Find translation keys and values...')
-            
-            # Find kv-pairs in translation file
-            translation_keys_and_values = shared.extract_translation_keys_and_values_from_file(translation_file_path)
-            
-            # Remove IB placeholders
-            for k in ib_placeholders.keys():
-                translation_keys_and_values.pop(k, 'None')
-            
-            # Extract keys from kv_pairs
-            translation_keys = set(translation_keys_and_values.keys())
-            
-            print(f'        Check missing/superfluous keys...')
-            
-            # Do set operations
-            missing_keys = base_keys.difference(translation_keys)
-            superfluous_keys = translation_keys.difference(base_keys)
-            common_keys = base_keys.intersection(translation_keys)
-            
-            # Get & attach missing / superfluous translations
-            #   Note: missing / superfluous can't be marked as !IS_OK
-            #   Note on source code keys:
-            #       For Localizable.strings, even the English 'base' strings file can have missing or superfluous keys compared to the source code which it translates.
-            #       However, we don't want to list those in the State of Localization, since it's the developers job to create the base English Localizable.strings file and keep it in sync with the source code. 
-            #       Any discrepancies between the English Localizable.strings file and the other languages will show up here.
-            missing_translations        = list(map(lambda k: {'key': k, 'value': base_keys_and_values[k]['value']['text']}, missing_keys))
-            superfluous_translations    = list(map(lambda k: {'key': k, 'value': translation_keys_and_values[k]['value']['text']}, superfluous_keys))
-            translation_dict['missing_translations'] = missing_translations
-            translation_dict['superfluous_translations'] = superfluous_translations
-            
-            # Check & attach unchanged & empty translations
-            # Note on `<>` checks: 
-            #   I saw we used `<>` to signal empty for kv-pairs pairs in `.strings` file that are actually defined in .stringsdict instead, maybe also other places. That's why we consider `<>` an empty string here.
-            #   Not sure if use of `<>` is the best idea. Why not just use actually empty string? Maybe bartycrouch complained or something?
-            
+        # Do set operations
+        missing_keys = set(expected_keys.keys()).difference(optional_keys).difference(translation_keys)
+        superfluous_keys = translation_keys.difference(expected_keys.keys())
+        common_keys = translation_keys.intersection(expected_keys.keys())
+        
+        # Get & attach missing / superfluous translations
+        #   Note: missing / superfluous can't be marked as !IS_OK
+        #   Note on source code keys:
+        #       For Localizable.strings, even the English 'base' strings file can have missing or superfluous keys compared to the source code which it translates.
+        #       However, we don't want to list those in the State of Localization, since it's the developers job to create the base English Localizable.strings file and keep it in sync with the source code. 
+        #       Any discrepancies between the English Localizable.strings file and the other languages will show up here.
+        missing_translations        = list(map(lambda k: {'key': k, 'value': base_keys_and_values[expected_keys[k]]['value']['text']}, missing_keys))
+        superfluous_translations    = list(map(lambda k: {'key': k, 'value': translation_keys_and_values[k]['value']['text']}, superfluous_keys))
+        translation_dict['missing_translations'] = missing_translations
+        translation_dict['superfluous_translations'] = superfluous_translations
+        
+        # Check & attach unchanged & empty translations
+        # Note on `<>` checks: 
+        #   I saw we used `<>` to signal empty for kv-pairs pairs in `.strings` file that are actually defined in .stringsdict instead, maybe also other places. That's why we consider `<>` an empty string here.
+        #   Not sure if use of `<>` is the best idea. Why not just use actually empty string? Maybe bartycrouch complained or something?
+        
+        
+        print(f'        Check unchanged & empty translations...')
+        
+        unchanged_translations = []
+        empty_translations = []
+        equal_to_key_translations = []
+        
+        for k in common_keys:
             
-            print(f'        Check unchanged & empty translations...')
+            b = base_keys_and_values[expected_keys[k]]['value']
+            t = translation_keys_and_values[k]['value']
             
-            unchanged_translations = []
-            empty_translations = []
-            equal_to_key_translations = []
+            # Check conditions:
+            #   Context:
+            #   - is_ok: !IS_OK flag is set. This is explained elsewhere in this file.
+            #   - is_equal: Not sure atm when this happens
+            #   - is_key: Apples `extractLocStrings` tool sets the value of the kv-pairs equal to the key when it generates a .strings file based on source code.
+            #   - is_format: The NSStringLocalizedFormatKey of a .stringsdict entry (e.g. `%@ %#@captured@`) is usually the same in every language, so we don't report it as unchanged.
+            #   - b_is_empty and t_is_empty:
+            #       - We leave some values in .strings files intentionally empty because they are defined elsewhere. In those cases the base value will be empty, and the translation value being also empty shouldn't be reported as a translation issue.
+            #       - If only the translation value is empty but not the base value that's a translation issue. Not sure atm when this happens.
             
-            for k in common_keys:
-                
-                b = base_keys_and_values[k]['value']
-                t = translation_keys_and_values[k]['value']
-                
-                # Check conditions:
-                #   Context:
-                #   - is_ok: !IS_OK flag is set. This is explained elsewhere in this file.
-                #   - is_equal: Not sure atm when this happens
-                #   - is_key: Apples `extractLocStrings` tool sets the value of the kv-pairs equal to the key when it generates a .strings file based on source code.
-                #   - b_is_empty and t_is_empty:
-                #       - We leave some values in .strings files intentionally empty because they are defined elsewhere. In those cases the base value will be empty, and the translation value being also empty shouldn't be reported as a translation issue.
-                #       - If only the translation value is empty but not the base value that's a translation issue. Not sure atm when this happens.
-                
-                is_ok = t['is_ok_count'] > 0
-                is_equal = t['text'] == b['text']
-                is_key = t['text'] == k
-                b_is_empty = len(b['text']) == 0 or b['text'] == '<>'
-                t_is_empty = len(t['text']) == 0 or t['text'] == '<>'
-                both_are_empty = b_is_empty and t_is_empty
-                
-                if is_equal and not both_are_empty and not is_ok:
-                    unchanged_translations.append({'key': k, 'value': t['text']})
-                elif not b_is_empty and t_is_empty and not is_ok:
-                    empty_translations.append({'key': k, 'value': t['text'], 'base_value': b['text']})
-                elif is_key and not is_ok:
-                    equal_to_key_translations.append({'key': k, 'value': t['text'], 'base_value': b['text']})
+            is_ok = t['is_ok_count'] > 0
+            is_equal = t['text'] == b['text']
+            is_key = t['text'] == k
+            is_format = base_file_type == '.stringsdict' and shared.split_stringsdict_key(k)[1] == None
+            b_is_empty = len(b['text']) == 0 or b['text'] == '<>'
+            t_is_empty = len(t['text']) == 0 or t['text'] == '<>'
+            both_are_empty = b_is_empty and t_is_empty
             
-            translation_dict['unchanged_translations'] = unchanged_translations
-            translation_dict['empty_translations'] = empty_translations
-            translation_dict['equal_to_key_translations'] = equal_to_key_translations
+            if is_equal and not both_are_empty and not is_ok and not is_format:
+                unchanged_translations.append({'key': k, 'value': t['text']})
+            elif not b_is_empty and t_is_empty and not is_ok:
+                empty_translations.append({'key': k, 'value': t['text'], 'base_value': b['text']})
+            elif is_key and not is_ok:
+                equal_to_key_translations.append({'key': k, 'value': t['text'], 'base_value': b['text']})
+        
+        translation_dict['unchanged_translations'] = unchanged_translations
+        translation_dict['empty_translations'] = empty_translations
+        translation_dict['equal_to_key_translations'] = equal_to_key_translations
+        
+        # Log
+        print(f'        Analyze when keys last changed...')
+        
+        # Check common keys if they are outdated.
+        
+        # For each key, get the commit when it last changed
+        latest_translation_changes = latest_changes[translation_file_path] if history_engine in ['index', 'log'] else get_latest_changes_for_file(common_keys, translation_file_path, repo)
+        
+        # For each key in the base file, get the commit when it last changed, if that's after the latest change to the translation
+        #   Base changes that are predecessors of all latest translation changes can't make any key outdated, so we don't need to walk back through the base file's history any further than that. (See history_since())
+        if history_engine not in ['index', 'log']:
+            latest_translation_commits = list({ latest_translation_changes[k]['commit'].hexsha: latest_translation_changes[k]['commit'] for k in common_keys }.values())
+            latest_base_changes = get_latest_changes_for_file(set(expected_keys[k] for k in common_keys), base_file_path, repo, since=latest_translation_commits)
+        
+        # Verbose logging stuff
+        if print_latest_for and print_latest_for in translation_file_path:
+            print(f"DEBUG latest changes for {print_latest_for}:\n\nLatest changes for base file at {base_file_path}:\n\n{latest_base_changes}\n\nLatest changes for translation at {translation_file_path}:\n\n{latest_translation_changes}\n\n")
+        
+        # Log
+        print(f'        Check if last modification was before base for each key ...')
+        
+        # Get the commit where the English Localizable.strings became the base (See special cases below)
+        become_base_commit = None
+        if is_mmf_repo(repo) and os.path.basename(base_file_path) in ('Localizable.strings'):
+            become_base_commit = get_commit_record(repo, 'd5aeb1195023b7bcea983d112ed0929b07311108')
+        
+        # Compare time of latest change for each key between base file and translation file
+        for k in common_keys:
             
-            # Log
-            print(f'        Analyze when keys last changed...')
+            # Skip keys whose base didn't change after the translation (See history_since())
+            if expected_keys[k] not in latest_base_changes:
+                continue
             
-            # Check common keys if they are outdated.
+            base_commit = latest_base_changes[expected_keys[k]]['commit']
+            translation_commit  = latest_translation_changes[k]['commit']
             
-            # For each key, get the commit when it last changed
-            latest_translation_changes = get_latest_change_for_translation_keys(common_keys, translation_file_path, repo)
+            is_outdated = not is_predecessor_or_equal(base_commit, translation_commit)
             
-            # Verbose logging stuff
-            if print_latest_for and print_latest_for in translation_file_path:
-                print(f"DEBUG latest changes for {print_latest_for}:\n\nLatest changes for base file at {base_file_path}:\n\n{latest_base_changes}\n\nLatest changes for translation at {translation_file_path}:\n\n{latest_translation_changes}\n\n")
+            # Special cases
+            # Notes: 
+            # - We first created `Localizable.strings` in German and then later translated it to English in commit d5aeb1195023b7bcea983d112ed0929b07311108 on 06.09.2022 [We could also use 9d385e6 on 22.09.2022 to spare us a few more `!IS_OK`s but it's whatever.]
+            #   This special case is to prevent those German strings from being detected as outdated.
+
+            if become_base_commit != None: # The commit where the English file became the base
+                if is_predecessor_or_equal(base_commit, become_base_commit):
+                    is_outdated = False
             
-            # Log
-            print(f'        Check if last modification was before base for each key ...')
+            # DEBUG
+            # if 'de.lproj/Localizable.strings' in translation_file_path and 'trial-counter.active' in k:
+            #     print(f"DEBUG:\n\nlatest_base: {base_commit}, latest_trans: {translation_commit}, is_outdated: {is_outdated}")
+            #     print(f"latest_base_change: {base_file_path}, change: {base_commit}")
+            #     print(f"translated_change: {translation_file_path}, change: {translation_commit}")
             
-            # Compare time of latest change for each key between base file and translation file
-            for k in common_keys:
-                
-                base_commit = latest_base_changes[k]['commit']
-                translation_commit  = latest_translation_changes[k]['commit']
-                
-                is_outdated = not is_predecessor_or_equal(base_commit, translation_commit)
-                
-                # Special cases
-                # Notes: 
-                # - We first created `Localizable.strings` in German and then later translated it to English in commit d5aeb1195023b7bcea983d112ed0929b07311108 on 06.09.2022 [We could also use 9d385e6 on 22.09.2022 to spare us a few more `!IS_OK`s but it's whatever.]
-                #   This special case is to prevent those German strings from being detected as outdated.
-
-                if is_mmf_repo(repo) and os.path.basename(base_file_path) in ('Localizable.strings'):
-                    become_base_commit = repo.commit('d5aeb1195023b7bcea983d112ed0929b07311108') # The commit where the English file became the base
-                    if is_predecessor_or_equal(base_commit, become_base_commit):
-                        is_outdated = False
-                
-                # DEBUG
-                # if 'de.lproj/Localizable.strings' in translation_file_path and 'trial-counter.active' in k:
-                #     print(f"DEBUG:\n\nlatest_base: {base_commit}, latest_trans: {translation_commit}, is_outdated: {is_outdated}")
-                #     print(f"latest_base_change: {base_file_path}, change: {base_commit}")
-                #     print(f"translated_change: {translation_file_path}, change: {translation_commit}")
-                
-                if is_outdated:
-                    translation_dict.setdefault('outdated_translations', {})[k] = { 'latest_base_change': latest_base_changes[k], 'latest_translation_change': latest_translation_changes[k] }    
+            if is_outdated:
+                translation_dict.setdefault('outdated_translations', {})[k] = { 'latest_base_change': latest_base_changes[expected_keys[k]], 'latest_translation_change': latest_translation_changes[k] }    
+        
+        # Record timing
+        timings['translations'][translation_file_path] = time.perf_counter() - translation_start_time
     
     # Return
-    return files
+    return timings
+
+pool_worker_startup_seconds = 0.2 # Spawning a worker that imports this script, measured on macOS
+
+def analyze_translation_keys_in_parallel(file_dicts, latest_changes, print_latest_for, jobs):
+    
+    """
+    Runs analyze_translation_keys() for each of the `file_dicts` in a pool of `jobs` processes, and records the results in the translation dicts, just like the serial version.
+        Returns the timings from analyze_translation_keys() for each of the `file_dicts`.
+    
+    Notes:
+    - Only plain data goes to the workers and back. git.Repo objects can't be pickled, so the workers open the repos themselves.
+    - The workers don't share memoized state. With the 'index' and 'log' engines, the history is scanned in the parent process before this, so the workers mostly extract and compare kv-pairs.
+    - The result is the same as for the serial run. markdown_from_analysis() sorts everything.
+    - We start the base files that take the longest first. Otherwise a slow IB file that's started last keeps one worker busy while the others are idle. (See estimated_analysis_costs())
+    """
+    
+    # Run serially if starting the workers takes longer than it saves
+    #   With the pool, the analysis takes at least as long as the slowest base file, plus the startup of the workers.
+    costs = estimated_analysis_costs(file_dicts)
+    jobs = min(jobs, len(file_dicts))
+    serial_seconds = sum(costs)
+    if jobs <= 1 or max(serial_seconds / jobs, max(costs)) + jobs * pool_worker_startup_seconds >= serial_seconds:
+        return [analyze_translation_keys(file_dict, latest_changes, print_latest_for) for file_dict in file_dicts]
+    
+    # Write cached extraction results to disk, so the workers see them
+    shared.flush_extraction_cache()
+    
+    # Build the repo-wide indexes before starting the workers
+    #   Forked workers inherit them, so they don't have to build them again. (Spawned workers build their own.)
+    if history_engine not in ['index', 'log']:
+        for repo in { file_dict['repo'].working_tree_dir: file_dict['repo'] for file_dict in file_dicts }.values():
+            get_rename_index(repo.working_tree_dir)
+            get_commit_graph(repo.working_tree_dir)
+            get_commit_record(repo, repo.head.commit.hexsha)
+    
+    # Schedule the slowest base files first
+    order = sorted(range(len(file_dicts)), key=lambda i: costs[i], reverse=True)
+    
+    # Prepare tasks
+    tasks = []
+    for i in order:
+        file_dict = file_dicts[i]
+        file_paths = [file_dict['base']] + list(file_dict['translations'].keys())
+        task_latest_changes = { path: latest_changes[path] for path in file_paths if path in latest_changes }
+        tasks.append((file_dict['base'], file_dict['repo'].working_tree_dir, file_dict['translations'], task_latest_changes, print_latest_for))
+    
+    # Run tasks
+    timings = [None] * len(file_dicts)
+    worker_settings = (history_engine, shared.extraction_cache_enabled, shared.IB_strings_extraction_backend)
+    with multiprocessing.Pool(processes=jobs, initializer=_init_analysis_worker, initargs=worker_settings) as pool:
+        for i, (translations, task_timings) in zip(order, pool.imap(_analyze_translation_keys_in_worker, tasks)):
+            for translation_file_path, translation_dict in translations.items():
+                file_dicts[i]['translations'][translation_file_path].update(translation_dict)
+            timings[i] = task_timings
+    
+    return timings
+
+def _init_analysis_worker(history_engine_arg, extraction_cache_enabled, IB_strings_extraction_backend):
+    
+    # Copies the settings from the parent process. (Processes that are spawned instead of forked don't inherit them.)
+    
+    global history_engine
+    history_engine = history_engine_arg
+    shared.extraction_cache_enabled = extraction_cache_enabled
+    shared.IB_strings_extraction_backend = IB_strings_extraction_backend
+
+def _analyze_translation_keys_in_worker(task):
+    
+    base_file_path, repo_root, translations, latest_changes, print_latest_for = task
+    
+    file_dict = { 'base': base_file_path, 'repo': git.Repo(repo_root), 'translations': translations }
+    timings = analyze_translation_keys(file_dict, latest_changes, print_latest_for)
+    
+    # Write cache (See shared.flush_extraction_cache())
+    shared.flush_extraction_cache()
+    
+    sys.stdout.flush()
+    
+    return file_dict['translations'], timings
+
+#
+# Analysis stats
+#
+
+# Notes:
+# - We record how long analyze_translation_keys() takes for each base file and each of its translations, and store it in a JSON file between runs. 
+#     analyze_translation_keys_in_parallel() uses that to start the slowest base files first.
+# - For files that we don't have timings for yet, we guess from the file type and the number of commits that touched the file. (See estimated_analysis_costs())
+# - The timings depend a lot on the history engine, so we store them separately for each engine.
+# - Files are identified by the name of their repo folder plus their path inside the repo, so the stats don't depend on where the repo is checked out.
+# - Use the `--print_analysis_stats` arg to see which files take the longest.
+
+analysis_stats_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), '.cache', 'analysis_stats.json') # Next to shared.extraction_cache_path
+analysis_stats_version = 1
+
+estimated_seconds_per_commit = { # Rough guesses for files that we don't have timings for. The history of IB files is by far the slowest to analyze, since we have to extract the strings from every version.
+    'IB':           0.02,
+    'stringsdict':  0.005,
+    'strings':      0.001,
+}
+
+def load_analysis_stats():
+    
+    """
+    Structure of the stats file:
+    {
+        'version': <analysis_stats_version>,
+        'engines': {
+            '<history_engine>': {
+                '<base_file_id>': {
+                    'base': <seconds>,
+                    'translations': { '<translation_file_id>': <seconds>, ... },
+                },
+                ...
+            },
+            ...
+        }
+    }
+    
+    See analysis_stats_file_id() for the file ids.
+    """
+    
+    empty_stats = { 'version': analysis_stats_version, 'engines': dict() }
+    
+    if not os.path.exists(analysis_stats_path):
+        return empty_stats
+    
+    try:
+        with open(analysis_stats_path, 'r', encoding='utf-8') as file:
+            stats = json.load(file)
+    except json.JSONDecodeError:
+        print(f"WARNING: Couldn't read analysis stats at {analysis_stats_path}. Starting over.")
+        return empty_stats
+    
+    if stats.get('version', None) != analysis_stats_version:
+        return empty_stats
+    
+    return stats
+
+def record_analysis_timings(file_dicts, timings):
+    
+    # Stores the `timings` (from analyze_translation_keys()) for each of the `file_dicts` in the stats file. Replaces the old timings for these files. 
+    #   Timings of translations that weren't analyzed this time (e.g. because they're in another `--shard`) are kept.
+    
+    stats = load_analysis_stats()
+    engine_stats = stats['engines'].setdefault(history_engine, dict())
+    
+    for file_dict, file_timings in zip(file_dicts, timings):
+        repo_root = file_dict['repo'].working_tree_dir
+        base_stats = engine_stats.setdefault(analysis_stats_file_id(file_dict['base'], repo_root), { 'translations': dict() })
+        base_stats['base'] = round(file_timings['base'], 4)
+        base_stats['translations'].update({ analysis_stats_file_id(path, repo_root): round(seconds, 4) for path, seconds in file_timings['translations'].items() })
+    
+    # Write
+    #   Through a temp file, so an interrupted run doesn't leave a broken file behind
+    os.makedirs(os.path.dirname(analysis_stats_path), exist_ok=True)
+    temp_path = analysis_stats_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(stats, file, indent=2, sort_keys=True)
+    os.replace(temp_path, analysis_stats_path)
+
+def estimated_analysis_costs(file_dicts):
+    
+    """
+    Returns the estimated number of seconds that analyze_translation_keys() will take for each of the `file_dicts`. 
+        Uses the timings from the last run where we have them. For the other files, we guess based on the type of the base file and the number of commits that touched each file.
+    """
+    
+    engine_stats = load_analysis_stats()['engines'].get(history_engine, dict())
+    
+    # Find recorded timings
+    #   Maps (file_dict_index, file_path) -> seconds, or None if we don't have a timing
+    recorded = dict()
+    for i, file_dict in enumerate(file_dicts):
+        repo_root = file_dict['repo'].working_tree_dir
+        base_stats = engine_stats.get(analysis_stats_file_id(file_dict['base'], repo_root), None)
+        recorded[(i, file_dict['base'])] = base_stats['base'] if base_stats else None
+        for path in file_dict['translations'].keys():
+            recorded[(i, path)] = base_stats['translations'].get(analysis_stats_file_id(path, repo_root), None) if base_stats else None
+    
+    # Count commits for the files without timings
+    #   (Only on the first run, or when there are new files) We take the counts from the RenameIndex, that's one git call per repo instead of one per file.
+    for (i, path), seconds in recorded.items():
+        if seconds == None:
+            repo_root = file_dicts[i]['repo'].working_tree_dir
+            relative_path = os.path.relpath(os.path.realpath(path), os.path.realpath(repo_root))
+            commit_count = len(get_rename_index(repo_root).changes_by_path.get(relative_path, []))
+            _, base_file_type = os.path.splitext(file_dicts[i]['base'])
+            recorded[(i, path)] = estimated_seconds_per_commit[history_type_for_file_type(base_file_type)] * max(commit_count, 1)
+    
+    # Sum up
+    result = [0.0] * len(file_dicts)
+    for (i, _), seconds in recorded.items():
+        result[i] += seconds
+    
+    return result
+
+def print_analysis_stats(count=20):
+    
+    # Prints the `count` analysis jobs that took the longest in the last run. (One job is one base file or one translation.)
+    
+    engine_stats = load_analysis_stats()['engines'].get(history_engine, dict())
+    
+    jobs = []
+    for base_id, base_stats in engine_stats.items():
+        jobs.append((base_stats['base'], base_id, None))
+        for translation_id, seconds in base_stats['translations'].items():
+            jobs.append((seconds, base_id, translation_id))
+    
+    total = sum(seconds for seconds, _, _ in jobs)
+    
+    print(f"Analysis stats: {len(jobs)} jobs took {total:.2f}s in total with the '{history_engine}' engine. The slowest {min(count, len(jobs))}:")
+    for seconds, base_id, translation_id in sorted(jobs, key=lambda j: j[0], reverse=True)[:count]:
+        share = seconds / total * 100 if total > 0 else 0
+        print(f"  {seconds:8.3f}s {share:5.1f}%  {translation_id or base_id}" + (f"  (translation of {os.path.basename(base_id)})" if translation_id else "  (base)"))
+
+def analysis_stats_file_id(file_path, repo_root):
+    # Identifies a file in the stats file. See the notes above.
+    return os.path.basename(os.path.realpath(repo_root)) + '/' + os.path.relpath(os.path.realpath(file_path), os.path.realpath(repo_root))
 
 #
 # Change analysis
 #
 
-def get_latest_change_for_translation_keys(wanted_keys, file_path, git_repo):
+def get_latest_change_for_translation_keys(wanted_keys, file_path, git_repo, since=None):
     
     """
     
     Note: If the is_ok_count goes up, that commit will also be treated as a 'change' to the value even if the translation text doesn't change. Little confusing but it should work.
     
+    `since` is an optional list of CommitRecords. If it's given, we only walk back as far as needed to find the changes in the range `since..HEAD` (or the union of these ranges if there are several commits), 
+        and keys that haven't changed in that range are left out of the result. (Their latest change is a predecessor of all the commits in `since`.) See history_since().
+    
     Structure of result:
     {
         "<translation_key>": {
-            "commit": git.Commit(<commit_of_lastest_change>),
+            "commit": CommitRecord(<commit_of_lastest_change>),
             "before": { "text": "<ui_text>", "is_ok_count": <int> },
             "after": { "text": "<ui_text>", "is_ok_count": <int> },
         }, 
@@ -1002,35 +1511,14 @@ def get_latest_change_for_translation_keys(wanted_keys, file_path, git_repo):
     _, file_type = os.path.splitext(file_path)
     
     # Preprocess file_type
-    t = 'strings' if (file_type == '.strings' or file_type == '.js') else 'IB' if (file_type == '.xib' or file_type == '.storyboard') else None
+    t = history_type_for_file_type(file_type)
     if t == None:
         assert False, f"Trying to get latest key changes for incompatible filetype {file_type}"
     
-    # Define reusable helper 
-    def parse_diff_and_update_state(diff_string, commit, result, wanted_keys):
-        
-        keys_and_values = shared.extract_translation_keys_and_values_from_string(diff_string)
-    
-        for key, changes in keys_and_values.items():
-            
-            if (key not in result) and (key in wanted_keys):
-                
-                added = changes.get('added', None)
-                deleted = changes.get('deleted', None)
-                added_ok_count = added['is_ok_count'] if added else 0
-                deleted_ok_count = deleted['is_ok_count'] if deleted else 0
-                added_text = added['text'] if added else None
-                deleted_text = deleted['text'] if deleted else None
-                
-                if added_ok_count > deleted_ok_count or added_text != deleted_text:
-                    new_entry = { 'commit': commit, 'before': deleted, 'after': added }
-                    result[key] = new_entry
-                    wanted_keys.remove(key)    
-    
     if t == 'strings':
         
         # Get commits
-        commits = get_commits_follow_renames(file_path, git_repo)
+        commits, _ = history_since(get_commits_follow_renames(file_path, git_repo), since, git_repo)
         
         # DEBUG
         # if 'de' in file_path:
@@ -1046,98 +1534,512 @@ def get_latest_change_for_translation_keys(wanted_keys, file_path, git_repo):
             #   Run git command 
             #   - For getting additions and deletions of the commit compared to its parent
             #   - I tried to do this with gitpython but nothing worked, maybe I should stop using gitpython altogether?
-            diff_string = shared.runCLT(f"git diff -U0 {commit['hash']}^..{commit['hash']} -- {commit['path']} {commit['previous_path'] or ''}", cwd=repo_root).stdout
+            #   Note: The parsed diff is memoized, since the base file's history is walked once for each of its translations. (See history_since())
+            diff_cache_key = ('keys_and_values_diff', os.path.realpath(repo_root), commit['hash'], commit['path'], commit['previous_path'])
+            keys_and_values_diff = _file_history_cache.get(diff_cache_key, None)
+            if keys_and_values_diff == None:
+                diff_string = shared.runCLT(f"git diff -U0 {commit['hash']}^..{commit['hash']} -- {commit['path']} {commit['previous_path'] or ''}", cwd=repo_root).stdout
+                
+                # Parse diff
+                keys_and_values_diff = _file_history_cache[diff_cache_key] = shared.extract_translation_keys_and_values_from_string(diff_string)
             
-            # Parse diff
-            parse_diff_and_update_state(diff_string, git_repo.commit(commit['hash']), result, wanted_keys)
+            update_latest_changes(keys_and_values_diff, get_commit_record(git_repo, commit['hash']), result, wanted_keys)
             
-    elif t == 'IB':
+    elif t == 'IB' or t == 'stringsdict':
         
         # Notes:
         # - This seems to be by far the slowest part of the script. It's still fast enough, but maybe look into optimizing.
         # -     Possible sources of slowness: subprocess calls (I read that command is faster), file-creations/reads/writes, complex git commands.
+        # -     Update: We don't run ibtool or create temp files anymore, everything happens in memory now.
         
-        commits = get_commits_follow_renames(file_path, git_repo) # list(git_repo.iter_commits(paths=file_path, reverse=False))
-        commits.append(None)
+        commits, base_version = history_since(get_commits_follow_renames(file_path, git_repo), since, git_repo) # list(git_repo.iter_commits(paths=file_path, reverse=False))
+        update_latest_changes_from_versions(commits, t, git_repo, result, wanted_keys, base_version=base_version)
+            
+    else:
+        assert False
+
+    # Return
+    return result
+
+def get_latest_change_for_translation_keys_with_blame(wanted_keys, file_path, git_repo, since=None):
+    
+    """
+    Does the same thing as get_latest_change_for_translation_keys(), but uses `git blame` to find the latest change for .strings and .js files. 
+        get_latest_change_for_translation_keys() has to walk back through the history until every key has been seen, which means walking through the entire history if a key hasn't changed in years. 
+        With blame it's one git call per file no matter how old the keys are.
+    
+    How it works:
+    - `git blame` tells us the last commit that touched the line of each kv-pair. Then we compare the kv-pair at that commit and at its parent.
+        If the value changed or the is_ok_count went up, that's the latest change. 
+        Otherwise (e.g. the is_ok_count went down, or something else on the line changed) blame can't tell us which change counts, so we fall back to get_latest_change_for_translation_keys() for those keys.
+    - Blame follows copies and renames with git's default similarity threshold (50%). But get_latest_change_for_translation_keys() uses 80% (See get_commits_follow_renames()), 
+        and it treats a copied file as a new file, since that's what `git diff` shows for it. To get the same results, we also get the commits of the file with get_commits_follow_renames(). 
+        If blame goes back further than the commit where the file was added or copied, we use that commit instead.
+    - IB and .stringsdict files can't be blamed line-by-line, so for those we always use get_latest_change_for_translation_keys().
+    
+    Notes:
+    - This makes 2 git calls per file, plus the fallback.
+    - We blame HEAD, not the working copy.
+    - `since` is only used for the fallback. The result can contain keys that didn't change since then, unlike with get_latest_change_for_translation_keys().
+    """
+    
+    # Preprocess
+    repo_root = git_repo.working_tree_dir
+    wanted_keys = wanted_keys.copy()
+    _, file_type = os.path.splitext(file_path)
+    
+    if history_type_for_file_type(file_type) != 'strings':
+        return get_latest_change_for_translation_keys(wanted_keys, file_path, git_repo, since=since)
+    
+    # Blame the file
+    path = os.path.relpath(os.path.realpath(file_path), os.path.realpath(repo_root))
+    blame_lines = git_blame_lines(repo_root, 'HEAD', path)
+    reader = shared.get_git_object_reader(repo_root)
+    
+    # Helper
+    #   Most keys were last changed in the same few commits, so we only read and parse each version of the file once.
+    parsed_versions = dict()
+    def keys_and_values_at(commit_hash, path):
+        if commit_hash == None:
+            return dict()
+        if (commit_hash, path) not in parsed_versions:
+            parsed_versions[(commit_hash, path)] = shared.extract_translation_keys_and_values_from_string(shared.decode_text(reader.read(commit_hash, path)))
+        return parsed_versions[(commit_hash, path)]
+    
+    # Find the commit where the file was added (or copied)
+    #   get_latest_change_for_translation_keys() doesn't look further back than this.
+    commits = get_commits_follow_renames(path, git_repo)
+    origin_index = next((i for i, commit in enumerate(commits) if commit['status_code'] in ['A', 'C']), len(commits) - 1)
+    newer_commit_hashes = set(commit['hash'] for commit in commits[:origin_index])
+    origin = { 'hash': commits[origin_index]['hash'], 'path': commits[origin_index]['path'], 'previous_hash': None, 'previous_path': None }
+    
+    # Find the latest commit that touched each kv-pair
+    #   Note: If a key appears several times, the last one wins, like in extract_translation_keys_and_values_from_string()
+    
+    latest_blames = dict()
+    commit_graph = get_commit_graph(repo_root)
+    text = shared.decode_text(reader.read('HEAD', path))
+    for token in shared.tokenize_strings_file(text, allow_multiline_kv=True, kv_only=True):
+        if token['key'] in wanted_keys:
+            token_line_count = token['line'].rstrip('\n').count('\n') + 1
+            token_blames = blame_lines[token['line_number']-1 : token['line_number']-1 + token_line_count]
+            latest_blame = max(token_blames, key=lambda b: commit_graph.topo_index[b['hash']]) # Descendants come after their ancestors in topo order. Committer times can be out of order after rebases or merges. (See is_predecessor_or_equal())
+            latest_blames[token['key']] = latest_blame if latest_blame['hash'] in newer_commit_hashes else origin
+    
+    # Check if the commits actually changed the kv-pairs
+    
+    result = dict()
+    fallback_keys = set()
+    
+    for key, blame in latest_blames.items():
         
-        last_strings_file_path = ''
+        before = keys_and_values_at(blame['previous_hash'], blame['previous_path']).get(key, None)
+        after = keys_and_values_at(blame['hash'], blame['path']).get(key, None)
+        before = before['value'] if before else None
+        after = after['value'] if after else None
         
-        for i, commit in enumerate(commits):
+        if after != None and (before == None or after['is_ok_count'] > before['is_ok_count'] or after['text'] != before['text']):
+            result[key] = { 'commit': get_commit_record(git_repo, blame['hash']), 'before': before, 'after': after }
+        else:
+            fallback_keys.add(key)
+    
+    # Fall back to walking through the history
+    #   For the keys that blame couldn't figure out. (Should only be the ones where the is_ok_count went down at some point)
+    fallback_keys.update(wanted_keys.difference(latest_blames.keys()))
+    if len(fallback_keys) > 0:
+        result.update(get_latest_change_for_translation_keys(fallback_keys, file_path, git_repo, since=since))
+    
+    # Return
+    return result
+
+def get_latest_changes_for_files(file_paths, git_repo, since=None, origin_paths=None):
+    
+    """
+    Does the same thing as get_latest_change_for_translation_keys() for many files at once, and for all their keys. 
+        Instead of running `git log --follow` for each file, and then `git diff` for each commit of each file, this runs a single `git log -p -U0` over all the files 
+        and routes the diff of each file to the files that we're tracking. That's one git process per repo instead of thousands.
+    
+    Structure of output:
+    {
+        "<file_path>": <output of get_latest_change_for_translation_keys() for all keys that the file ever had>,
+        ...
+    }
+    
+    Notes:
+    - .strings and .js files are diffed by git (like in get_latest_change_for_translation_keys()). IB and .stringsdict files need to be diffed by extracting their kv-pairs, 
+        so for those, we only read the blob IDs from a second `git log --raw` and then diff the kv-pairs of consecutive versions with update_latest_changes_from_versions().
+    - We follow renames like `git log --follow` does. But unlike `--follow`, git only looks for rename sources among the files matching the pathspec 
+        (all files with the same extensions as `file_paths`), and it simplifies merges for all the files together instead of for each file separately. 
+        For the linear history of the mmf repos that should make no difference. 
+    - We don't detect copies for .strings and .js files. get_latest_change_for_translation_keys() diffs a copy as a new file, so a copied file is treated as added either way.
+    - The similarity thresholds for renames are the same as in get_commits_follow_renames(). See rename_similarity_thresholds.
+    
+    Notes on `since`:
+    - If `since` is a commit, only the changes after that commit are scanned. (`git log <since>..HEAD`) The version of IB and stringsdict files at `since` is used as the starting point for diffing instead of an empty file.
+        Keys that didn't change after `since` won't be in the result. That's how the key history index only processes new commits. (See get_latest_changes_from_index())
+    - If you pass a dict as `origin_paths`, it's filled with the path (relative to the repo root) of each file at `since`, or None if the file didn't exist at `since`.
+    """
+    
+    # Preprocess
+    repo_root = git_repo.working_tree_dir
+    
+    # Sort files by how we track their history
+    #   We track the files by their path relative to the repo root at the current point in the history. Several files can be tracked under the same path after a copy.
+    
+    result = dict()
+    tracked_files = { 'strings': dict(), 'versions': dict() }
+    file_versions = dict()
+    
+    for file_path in file_paths:
+        
+        _, file_type = os.path.splitext(file_path)
+        t = history_type_for_file_type(file_type)
+        assert t != None, f"Trying to get latest key changes for incompatible filetype {file_type}"
+        
+        result[file_path] = dict()
+        relative_path = os.path.relpath(os.path.realpath(file_path), os.path.realpath(repo_root))
+        tracked_files['strings' if t == 'strings' else 'versions'].setdefault(relative_path, []).append(file_path)
+        if t != 'strings':
+            file_versions[file_path] = []
+    
+    # Scan history
+    
+    for kind, tracked in tracked_files.items():
+        
+        if len(tracked) == 0:
+            continue
+        
+        file_types = sorted(set(os.path.splitext(path)[1] for path in tracked.keys()))
+        pathspecs = ['*' + file_type for file_type in file_types]
+        similarity_threshold = min(rename_similarity_thresholds[file_type] for file_type in file_types)
+        
+        rev_range = f'{since}..HEAD' if since != None else None
+        
+        for commit_hash, status, patch in iter_file_changes_in_log(repo_root, pathspecs, similarity_threshold, with_patch=(kind == 'strings'), find_copies=(kind != 'strings'), rev_range=rev_range):
             
-            # Break
-            if len(wanted_keys) == 0:
-                break
+            path = status['file2'] or status['file1']
+            tracked_paths = tracked.get(path, None)
+            if tracked_paths == None:
+                continue
+            
+            # Apply the similarity threshold for the file type
+            #   If the file doesn't count as renamed, git's diff of the rename is useless to us, so we diff the file against an empty file instead, like git does for added files.
+            thresholded_status = apply_rename_similarity_threshold(status)
+            if thresholded_status is not status:
+                status = thresholded_status
+                if kind == 'strings':
+                    content = shared.decode_text(shared.get_git_object_reader(repo_root).read(status['blob2']))
+                    lines = content.split('\n') # Not splitlines(), see shared.tokenize_strings_file()
+                    if lines[-1] == '':
+                        lines.pop()
+                    patch = ''.join('+' + line + '\n' for line in lines)
             
-            # Get strings file for this commit
-            if commit == None:
-                # This case is weird
-                #   The 'None' commit symbolizes the parent of the initial commit of the file.
-                #   We say the parent of the strings file at the initial commit is an empty file, that way we can get diff values in the format we expect for the initial commit.
-                assert i == (len(commits) - 1)
-                strings_file_path = shared.create_temp_file()
+            # Record change
+            if kind == 'strings':
+                keys_and_values_diff = shared.extract_translation_keys_and_values_from_string(patch)
+                if len(keys_and_values_diff) > 0:
+                    for file_path in tracked_paths:
+                        update_latest_changes(keys_and_values_diff, get_commit_record(git_repo, commit_hash), result[file_path], None)
             else:
+                for file_path in tracked_paths:
+                    file_versions[file_path].append({'hash': commit_hash, 'blob': status['blob2']})
+            
+            # Follow the files back through renames and copies
+            #   Before the file was added, there's nothing left to track.
+            if status['code'] in ['R', 'C']:
+                tracked.pop(path)
+                tracked.setdefault(status['file1'], []).extend(tracked_paths)
+            elif status['code'] == 'A':
+                tracked.pop(path)
+    
+    # Find paths at `since`
+    #   The files that are still tracked after scanning the history already existed at `since`
+    origins = { file_path: None for file_path in file_paths }
+    for tracked in tracked_files.values():
+        for path, tracked_paths in tracked.items():
+            for file_path in tracked_paths:
+                origins[file_path] = path
+    
+    # Diff the versions of IB and stringsdict files
+    for file_path, versions in file_versions.items():
+        
+        base_version = None
+        if since != None and origins[file_path] != None:
+            base_object = shared.get_git_object_reader(repo_root).read_object(f'{since}:{origins[file_path]}')
+            if base_object == None:
+                # The path doesn't exist at `since` after all - scan the full history of the file instead
+                origins[file_path] = None
+                result[file_path] = get_latest_changes_for_files([file_path], git_repo)[file_path]
+                continue
+            base_version = {'hash': since, 'blob': base_object['sha']}
+        
+        _, file_type = os.path.splitext(file_path)
+        update_latest_changes_from_versions(versions, history_type_for_file_type(file_type), git_repo, result[file_path], None, base_version)
+    
+    if origin_paths != None:
+        origin_paths.update(origins)
+    
+    # Return
+    return result
 
-                hash = commit['hash']
-                path = commit['path']
-                
-                path_relative = path # `git show` breaks with absolute paths, but paths from get_commits_follow_renames() are already relative
-                
-                path_for_content_at_this_commit = shared.create_temp_file(suffix=file_type)
-                git_show_cmd = f"git show {hash}:'{path_relative}' > {path_for_content_at_this_commit}"
-                shared.runCLT(git_show_cmd, cwd=repo_root)
-                strings_file_path = shared.extract_strings_from_IB_file_to_temp_file(path_for_content_at_this_commit)
-                
-                # Debug
-                # if "LicenseSheetController" in file_path:
-                    # print(f"Licensesheet diff - {diff_string}")
-                    # print(f"Licensesheet debug - repo root: {repo_root}, cmd: {git_show_cmd}, result {read_tempfile(path_for_content_at_this_commit)}, cltResult: {cltResult}")
-                
-            if i != 0: 
-                
-                # Get diff
-                
-                # Notes: 
-                #  We skip the first iteration. That's because, on the first iteration,
-                #  there's no `last_strings_file_path` to diff against.
-                #  To 'make up' for this lack of diff on the first iteration, we have the extra 'None' commit. 
-                #  Kind of confusing but it should work.
-                
-                # Validate
-                assert last_strings_file_path != ''
-                
-                # Get diff string
-                diff_string = shared.runCLT(f"git diff -U0 --no-index -- {strings_file_path} {last_strings_file_path}", cwd=repo_root).stdout
-                
-                # Parse diff, update state * record result
-                result_commit = git_repo.commit(commits[i-1]['hash']) if commits[i-1] else None
-                parse_diff_and_update_state(diff_string, result_commit, result, wanted_keys)
-                
-                # Cleanup
-                os.remove(last_strings_file_path)
+def history_type_for_file_type(file_type):
+    
+    # Returns how we track the history of kv-pairs in files of this type. 
+    #   'strings': We parse the `git diff` of each commit. 
+    #   'IB' and 'stringsdict': We extract the kv-pairs of each version of the file and diff those.
+    
+    return ('strings' if (file_type == '.strings' or file_type == '.js') else 
+            'IB' if (file_type == '.xib' or file_type == '.storyboard') else 
+            'stringsdict' if file_type == '.stringsdict' else 
+            None)
+
+def update_latest_changes(keys_and_values_diff, commit, result, wanted_keys):
+    
+    """
+    Records the changes from `keys_and_values_diff` (which has the format of extract_translation_keys_and_values_from_string() called on a diff) in `result`, 
+        for keys that are in `wanted_keys` and that don't have a newer change recorded already. Found keys are removed from `wanted_keys`. 
+        If `wanted_keys` is None, all keys are recorded.
+    """
+    
+    for key, changes in keys_and_values_diff.items():
+        
+        if (key not in result) and (wanted_keys == None or key in wanted_keys):
             
-            # Update state
-            last_strings_file_path = strings_file_path
+            added = changes.get('added', None)
+            deleted = changes.get('deleted', None)
+            added_ok_count = added['is_ok_count'] if added else 0
+            deleted_ok_count = deleted['is_ok_count'] if deleted else 0
+            added_text = added['text'] if added else None
+            deleted_text = deleted['text'] if deleted else None
             
-    else:
-        assert False
+            if added_ok_count > deleted_ok_count or added_text != deleted_text:
+                new_entry = { 'commit': commit, 'before': deleted, 'after': added }
+                result[key] = new_entry
+                if wanted_keys != None:
+                    wanted_keys.remove(key)
+
+def update_latest_changes_from_versions(versions, t, git_repo, result, wanted_keys, base_version=None):
+    
+    """
+    Finds the latest change for each key by extracting the kv-pairs of every version of a file and diffing them. This is how we track the history of IB and stringsdict files.
+        `versions` is a list of versions of the file from newest to oldest. Each has a 'hash' of the commit that created it and the 'blob' ID of the content. (Like the output of get_commits_follow_renames())
+        Results are recorded like in update_latest_changes().
+        `base_version` is the version before the oldest one in `versions`. Changes are only recorded for `versions`, the base version is only diffed against. If it's None, we diff against an empty file.
+    
+    Notes:
+    - This seems to be by far the slowest part of the script. It's still fast enough, but maybe look into optimizing.
+    -     Possible sources of slowness: subprocess calls (I read that command is faster), file-creations/reads/writes, complex git commands.
+    -     Update: We don't run ibtool or create temp files anymore, everything happens in memory now.
+    """
+    
+    repo_root = git_repo.working_tree_dir
+    versions = versions + [base_version]
+    
+    last_keys_and_values = None
+    
+    for i, version in enumerate(versions):
+        
+        # Break
+        if wanted_keys != None and len(wanted_keys) == 0:
+            break
+        
+        # Get keys and values for this commit
+        if version == None:
+            # This case is weird
+            #   The 'None' commit symbolizes the parent of the initial commit of the file. (Unless there's a `base_version`)
+            #   We say the parent of the strings file at the initial commit is an empty file, that way we can get diff values in the format we expect for the initial commit.
+            assert i == (len(versions) - 1)
+            keys_and_values = dict()
+        else:
+            content = shared.get_git_object_reader(repo_root).read(version['blob'])
+            assert content != None, f"Couldn't read blob {version['blob']} from commit {version['hash']}"
+            if t == 'IB':
+                strings = shared.extract_strings_from_IB_content(content)
+                keys_and_values = shared.extract_translation_keys_and_values_from_string(strings)
+            else:
+                keys_and_values = shared.extract_translation_keys_and_values_from_stringsdict(content)
+            
+        if i != 0: 
+            
+            # Get diff
+            
+            # Notes: 
+            #  We skip the first iteration. That's because, on the first iteration,
+            #  there's no `last_keys_and_values` to diff against.
+            #  To 'make up' for this lack of diff on the first iteration, we have the extra 'None' commit. 
+            #  Kind of confusing but it should work.
+            
+            # Validate
+            assert last_keys_and_values != None
+            
+            # Get diff
+            keys_and_values_diff = shared.diff_translation_keys_and_values(keys_and_values, last_keys_and_values)
+            
+            # Update state * record result
+            result_commit = get_commit_record(git_repo, versions[i-1]['hash']) if versions[i-1] else None
+            update_latest_changes(keys_and_values_diff, result_commit, result, wanted_keys)
+        
+        # Update state
+        last_keys_and_values = keys_and_values
+
+#
+# Key history index
+#
+
+# Notes:
+# - Finding the latest change for each key means going through the whole history of every localization file, but between two runs of this script only a few commits are added.
+#     So we store the result of get_latest_changes_for_files() in an SQLite database, along with the HEAD commit of the repo at that point. 
+#     The next run only scans the commits after that HEAD, and takes the latest changes for all other keys from the database.
+# - The GitHub Action keeps the index between runs, like the extraction cache.
+# - If the stored HEAD isn't an ancestor of the current HEAD anymore (e.g. after a force-push), the index is rebuilt from scratch. Use the `--rebuild_index` arg to force a rebuild.
+# - !! Bump `key_history_index_version` when you change the output of get_latest_changes_for_files(). Otherwise the index will keep returning the old results. !!
+
+key_history_index_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), '.cache', 'key_history_index.sqlite3') # Next to shared.extraction_cache_path
+key_history_index_version = 1
 
+def get_latest_changes_from_index(file_paths, git_repo, rebuild=False):
+    
+    """
+    Returns the same thing as get_latest_changes_for_files(), but only scans the commits since the last time it was called for the repo. (See notes above.)
+        The index is updated with the result, so it should always be called with all the files of the repo that we want to track.
+    """
+    
+    # Preprocess
+    repo_root = git_repo.working_tree_dir
+    repo_name = os.path.basename(os.path.realpath(repo_root)) # The absolute path is different on every machine, so we identify repos by their folder name
+    head = git_repo.head.commit.hexsha
+    
+    connection = _open_key_history_index()
+    
+    # Find the commit where we left off
+    since = None
+    row = connection.execute("SELECT head FROM indexed_heads WHERE repo = ?", (repo_name,)).fetchone()
+    if row != None and not rebuild:
+        is_ancestor = subprocess.run(['git', 'merge-base', '--is-ancestor', row[0], head], cwd=repo_root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        if is_ancestor:
+            since = row[0]
+        else:
+            print(f"INFO: The last indexed commit {row[0]} of {repo_name} is not an ancestor of HEAD anymore. Rebuilding the key history index.")
+    
+    # Scan the new commits
+    origin_paths = dict()
+    result = get_latest_changes_for_files(file_paths, git_repo, since=since, origin_paths=origin_paths)
+    
+    # Fill in the keys that didn't change from the index
+    if since != None:
+        
+        # Scan the full history of files that existed before but weren't indexed
+        indexed_paths = set(path for (path,) in connection.execute("SELECT path FROM indexed_files WHERE repo = ?", (repo_name,)))
+        unindexed_files = [file_path for file_path, origin_path in origin_paths.items() if origin_path != None and origin_path not in indexed_paths]
+        if len(unindexed_files) > 0:
+            result.update(get_latest_changes_for_files(unindexed_files, git_repo))
+        
+        # Fill in
+        for file_path, origin_path in origin_paths.items():
+            if origin_path == None or file_path in unindexed_files:
+                continue
+            for key, commit_hash, before, after in connection.execute("SELECT key, commit_hash, before, after FROM key_changes WHERE repo = ? AND path = ?", (repo_name, origin_path)):
+                if key not in result[file_path]:
+                    result[file_path][key] = {'commit': get_commit_record(git_repo, commit_hash), 'before': json.loads(before), 'after': json.loads(after)}
+    
+    # Update the index
+    
+    connection.execute("DELETE FROM indexed_files WHERE repo = ?", (repo_name,))
+    connection.execute("DELETE FROM key_changes WHERE repo = ?", (repo_name,))
+    
+    for file_path, changes in result.items():
+        path = os.path.relpath(os.path.realpath(file_path), os.path.realpath(repo_root))
+        connection.execute("INSERT OR REPLACE INTO indexed_files (repo, path) VALUES (?, ?)", (repo_name, path))
+        connection.executemany("INSERT OR REPLACE INTO key_changes (repo, path, key, commit_hash, before, after) VALUES (?, ?, ?, ?, ?, ?)", 
+                               [(repo_name, path, key, change['commit'].hexsha, json.dumps(change['before'], ensure_ascii=False), json.dumps(change['after'], ensure_ascii=False)) for key, change in changes.items()])
+    
+    connection.execute("INSERT OR REPLACE INTO indexed_heads (repo, head) VALUES (?, ?)", (repo_name, head))
+    
+    connection.commit()
+    connection.close()
+    
     # Return
     return result
 
+def clear_key_history_index():
+    if os.path.exists(key_history_index_path):
+        os.remove(key_history_index_path)
+
+def _open_key_history_index():
+    
+    # Open db
+    os.makedirs(os.path.dirname(key_history_index_path), exist_ok=True)
+    connection = sqlite3.connect(key_history_index_path)
+    
+    # Throw away index from other versions
+    connection.execute("CREATE TABLE IF NOT EXISTS index_version (version INTEGER)")
+    row = connection.execute("SELECT version FROM index_version").fetchone()
+    if row == None or row[0] != key_history_index_version:
+        for table in ['indexed_heads', 'indexed_files', 'key_changes']:
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+        connection.execute("DELETE FROM index_version")
+        connection.execute("INSERT INTO index_version (version) VALUES (?)", (key_history_index_version,))
+    
+    # Create tables
+    connection.execute("CREATE TABLE IF NOT EXISTS indexed_heads (repo TEXT PRIMARY KEY, head TEXT)")                   # The HEAD commit of each repo when it was last indexed
+    connection.execute("CREATE TABLE IF NOT EXISTS indexed_files (repo TEXT, path TEXT, PRIMARY KEY (repo, path))")     # The files that were indexed, by their path at that HEAD. (Relative to the repo root)
+    connection.execute("CREATE TABLE IF NOT EXISTS key_changes (repo TEXT, path TEXT, key TEXT, commit_hash TEXT, before TEXT, after TEXT, PRIMARY KEY (repo, path, key))") # The latest change for each key. `before` and `after` are json.
+    connection.commit()
+    
+    return connection
+
 #
 # Analysis helpers
 #
 
-def iter_content_changes(file_path_arg, repo):
+def expected_translation_keys(base_keys, base_file_type, language_id):
+    
+    """
+    Returns the keys that a translation of a base file can have.
+        Result: (expected_keys, optional_keys)
+        - expected_keys maps each key the translation can have to the key in the base file that it translates.
+        - optional_keys is the subset of expected_keys that isn't missing if the translation doesn't have it.
+    
+    For most file types, the translation should have the same keys as the base file. 
+        But for .stringsdict files, which plural categories (one, few, many, etc.) a translation needs depends on its language.
+        Categories the base file doesn't have translate the base's `other` category.
+        The `zero` category is optional unless the language has a zero plural form. (Apple lets you use it to special-case 0 in any language)
+    """
+    
+    if base_file_type != '.stringsdict':
+        return {k: k for k in base_keys}, set()
+    
+    # Get plural categories of the translation language
+    plural_categories = set(babel.Locale.parse(language_id, sep='-').plural_form.tags) | {'other'}
+    
+    # Get expected keys
+    expected_keys = dict()
+    optional_keys = set()
+    for k in base_keys:
+        prefix, category = shared.split_stringsdict_key(k)
+        if category == None:
+            expected_keys[k] = k
+        elif category == 'other':
+            for c in plural_categories | {'zero'}:
+                key = f'{prefix}.{c}'
+                expected_keys[key] = key if key in base_keys else k
+            if 'zero' not in plural_categories:
+                optional_keys.add(f'{prefix}.zero')
+    
+    return expected_keys, optional_keys
+
+def get_content_changes(file_path_arg, repo):
 
-    # Iterate commits that actually changed the content of `file_path`. 
+    # Returns the commits that actually changed the content of `file_path`, from newest to oldest, as CommitRecords. 
     #   We do this to exclude commits where the file was just renamed and the content didn't change.
     #   This is used to determine outdating commits. Maybe we should put this in line with that instead of having a separate function?
-
-    # Prepare
+    #   We compare the blob IDs that `git log --raw` gives us, instead of the file contents. That way we don't have to load any file contents.
+    #   Note: Don't mutate the result, it's shared by all callers. (See get_commits_follow_renames())
     
-    repo_root = repo.working_tree_dir
-    file_path_relative = os.path.relpath(file_path_arg, repo_root) # `git show` breaks with absolute paths
+    # Check cache
+    cache_key = ('content_changes', *file_history_cache_key(file_path_arg, repo))
+    if cache_key in _file_history_cache:
+        return _file_history_cache[cache_key]
     
     # Get changes
     
@@ -1146,27 +2048,61 @@ def iter_content_changes(file_path_arg, repo):
     assert len(changes) > 0
     
     # Loop changes and return changes where content actually changed.
+    #   Changes are ordered from newest to oldest, so the content before each change is the content at the next change in the list. 
+    #   The oldest change is always returned.
     
-    last_hash = changes[0]['hash']
-    last_content = shared.runCLT(f"git show {last_hash}:'{file_path_relative}'", cwd=repo_root).stdout
+    result = []
     
-    if len(changes) > 1:
-        for commit in changes[1:]:
-            
-            hash = commit['hash']
-            path = commit['path']
-            
-            content = shared.runCLT(f"git show {hash}:'{path}'", cwd=repo_root).stdout
-            
-            if content != last_content:
-                yield repo.commit(last_hash)
-        
-            last_content = content
-            last_hash = hash
+    for i, change in enumerate(changes):
+        is_oldest = i == len(changes) - 1
+        if is_oldest or change['blob'] != changes[i+1]['blob']:
+            result.append(get_commit_record(repo, change['hash']))
+    
+    # Store
+    _file_history_cache[cache_key] = result
+    
+    return result
+
+_file_history_cache = dict() # Memoizes get_commits_follow_renames(), get_content_changes() and the parsed diffs in get_latest_change_for_translation_keys() for the duration of the run
+
+def history_since(commits, since, repo):
+    
+    """
+    Cuts off the part of the history of a file that's older than the commits in `since`.
+        `commits` is a list of changes to a file from newest to oldest. (Like the output of get_commits_follow_renames())
+        `since` is a list of CommitRecords, or None.
+    
+    Returns `(newer_commits, base_version)`:
+    - `newer_commits` is the prefix of `commits` that contains all the commits in the range `since..HEAD`. (That means all commits that aren't predecessors of every commit in `since`.) 
+        If `since` is None, that's all of `commits`.
+    - `base_version` is the entry right after `newer_commits` (the version of the file before the oldest of `newer_commits`), or None if there's no such entry.
+    
+    Notes:
+    - To find out if a translation is outdated, we only need the changes to the base file that happened after the latest changes to the translation. 
+        So we use the translation's latest changes as `since`. If the translation is up to date, the range is usually empty and we don't have to look at the base file's history at all.
+    - We return a prefix instead of just the commits in the range, since update_latest_changes_from_versions() diffs each version against the next one in the list. 
+        (The history isn't linear when there are merges, so older commits can come before newer ones in the list.)
+    """
+    
+    if since == None:
+        return commits, None
     
-    yield repo.commit(changes[-1]['hash'])
+    graph = get_commit_graph(repo.working_tree_dir)
+    since_hashes = set(commit.hexsha for commit in since)
     
-def get_commits_follow_renames(file_path_arg, repo, similarity_threshold=80):
+    end = 0
+    for i, commit in enumerate(commits):
+        if not all(graph.is_ancestor_or_equal(commit['hash'], since_hash) for since_hash in since_hashes):
+            end = i + 1
+    
+    return commits[:end], (commits[end] if end < len(commits) else None)
+
+def file_history_cache_key(file_path, repo):
+    # Identifies the history of a file for _file_history_cache. Relative paths are relative to the repo root.
+    repo_root = repo.working_tree_dir
+    return (os.path.realpath(repo_root), repo.head.commit.hexsha, os.path.realpath(os.path.join(repo_root, file_path)))
+
+def get_commits_follow_renames(file_path_arg, repo):
 
     """
     Returns a list of commits that changed the file at `file_path`. The list follows the changes through renames of the file. 
@@ -1183,68 +2119,36 @@ def get_commits_follow_renames(file_path_arg, repo, similarity_threshold=80):
             'previous_path':    <path_of_file_before_rename>,      # Is None unless the files has been renamed this commit
             "status_code":      <git_file_status_code>,            # e.g. M for modified, A for added, R for renamed, etc.
             'similarity':       <git_similarity_index>,            # How similar the file is after a rename in %. Is 100 if the file was just renamed and the content didn't change.
+            'blob':             <blob_sha>,                        # The git blob ID of the file content at this commit
+            'previous_blob':    <blob_sha>,                        # The git blob ID of the file content before this commit. Is all zeros if the file was added this commit.
         }, 
         ...
     ]
     
-    Notes on similarity_threshold:
-    - The default git similarity threshold in git is 50%, but that made it so some strings files that were added for a new language were marked as copies
-      E.g. When App/UI/LicenseSheet/zh-Hans.lproj/LicenseSheetController.strings was added in aadba972bfccf4f3a12b8717014cb07708b3e2f7, 
-        it had 64% similarity with the German version, even though it was fully translated.
-        Between Korean and Chinese, I saw 76% similarity for 2 fully translated files.
-        80% as the threshold seems to work at this moment.
-      The high similarity between translated files is probably because all the comment lines and all the keys are the same between all languages in `.strings.` files.
-      Maybe we should apply different similarity thresholds depending on file type.
+    The result is memoized for the current HEAD, since we need the history of each base file once for each of its translations. Don't mutate it.
+    
+    Notes:
+    - We used to run `git log --follow` for each file. Now we look up the history in the RenameIndex, which is built from a single `git log` over all localization files in the repo.
+        Since every commit records the path the file had at that point, `git show` and `git diff` can always be called with the right historical path. That's what makes renamed files analyzable.
+    - The similarity threshold for renames and copies depends on the file type. See rename_similarity_thresholds.
     """
-
-    # TODO: Update these comments.
-    # Use `git log --follow` to get a list of `git.Commit()`s that changed a file, while following file-renames.
-    # Notes: 
-    # - The old way we iterated through commits is `repo.iter_commits(paths=file_path)`, but that doesn't follow renames. I hope that switching to this doesn't cause problems.
-    # - UDPATE: RENAMES DON'T WORK YET. neither `git show` nor `git diff` can follow renames when called on a specific file. 
-    #   `git diff` can detect renames but only when called on the whole repo not when a path is specified. We could probably do some manual parsing to make this work but that't tooo hard for now. 
-    #   If we can't get diffs between renames, then we don't need to iterate through commits on files through renames either. Hence this function is unnecessary.
-    #   Tracking changes through renames is but a dream for us at this point. So I guess we'll just have to abide by this principle: 
-    #       
-    #       Don't rename files unless all the issues detected by this script are resolved! I think then everything should be sound.
-    #
-    #   TODO: Remove this renames stuff, since it doesn't work 
-    
-    # Just use iter_commits since we can't track renames anyways
-    # return list(repo.iter_commits(paths=file_path))
     
     # Preprocess
     repo_path = repo.working_tree_dir
     file_path = file_path_arg # os.path.relpath(file_path_arg, repo_path) # `git show` breaks with absolute paths, not sure if this is necessary for `git log`
     
-    # Call git log
+    # Check cache
+    cache_key = ('commits_follow_renames', *file_history_cache_key(file_path, repo))
+    if cache_key in _file_history_cache:
+        return _file_history_cache[cache_key]
     
-    sep= "\n@@@COMMIT@@@\n"
-    cmd = f"git -C {repo_path} log --follow -M{str(similarity_threshold)}% --name-status --format='{sep}%H' -- {file_path}"
-    sub_return = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True, cwd=repo.working_tree_dir)
-    if sub_return.returncode != 0:
-        raise Exception("Git command failed: " + sub_return.stderr)
-
-    # Parse the output
+    # Get history from rename index
     
-    result = []
+    relative_path = os.path.relpath(os.path.realpath(os.path.join(repo_path, file_path)), os.path.realpath(repo_path))
     
-    commit_strs = sub_return.stdout.split(sep)[1:]
+    result = []
     
-    for commit_str in commit_strs:
-        
-        commit_lines = commit_str.splitlines()
-        
-        commit_hash = commit_lines[0]
-        file_status_lines = commit_lines[1:]
-        
-        status_list = []
-        for status_line in file_status_lines:
-            status = parse_git_status_line(status_line)
-            if status: status_list.append(status)
-        
-        assert len(status_list) == 1
-        status = status_list[0]
+    for commit_hash, status in get_rename_index(repo_path).follow(relative_path):
         
         # Validate
         # Status C (copy) does sometimes happen in the repo history, for example in d48bd4c991136c3b37cf383f86aeb6db05a52194, the korean Localizable.strings is just a copy of the english version, and then later it's changed.
@@ -1258,32 +2162,165 @@ def get_commits_follow_renames(file_path_arg, repo, similarity_threshold=80):
         current_path = status['file2'] or status['file1']
         previous_path = status['file1'] if status['file2'] else None
         
-        result.append({'hash': commit_hash, 'path': current_path, 'previous_path': previous_path, "status_code": status['code'], 'similarity': status['similarity']})
+        result.append({'hash': commit_hash, 'path': current_path, 'previous_path': previous_path, "status_code": status['code'], 'similarity': status['similarity'], 'blob': status['blob2'], 'previous_blob': status['blob1']})
     
+    # Store
+    _file_history_cache[cache_key] = result
 
     # Return
     
     return result
 
+def iter_file_changes_in_log(repo_root, pathspecs, similarity_threshold=80, with_patch=False, find_copies=False, rev_range=None):
+    
+    """
+    Streams `git log --raw` for all files matching `pathspecs` and yields one `(commit_hash, status, patch)` tuple for every file that was changed by a commit, from newest to oldest commit.
+        `status` is the output of parse_git_status_line(). 
+        `patch` is the `git diff -U0` section for the file if `with_patch` is True, otherwise it's None.
+        `rev_range` limits the commits, e.g. `<commit>..HEAD`. By default, the whole history of HEAD is scanned.
+    
+    Notes:
+    - We read the output line by line, so we never hold the whole history in memory.
+    - With `--raw` and `-p`, git first prints the raw line for each file of the commit, and then the diff section for each file in the same order. That's how we match them up.
+    - Merge commits don't have a diff by default, so they don't show up here. (Same as with `git log --follow`.)
+    """
+    
+    # Build command
+    cmd = ['git', '-c', 'core.quotePath=false', 'log', '--raw', '--no-abbrev', f'-M{similarity_threshold}%', '--format=%x00%H']
+    if find_copies:
+        cmd += [f'-C{similarity_threshold}%', '--find-copies-harder']
+    if with_patch:
+        cmd += ['-p', '-U0']
+    if rev_range != None:
+        cmd += [rev_range]
+    cmd += ['--'] + pathspecs
+    
+    # Helper
+    def commit_file_changes(commit_hash, statuses, patches):
+        if with_patch:
+            assert len(statuses) == len(patches), f"Couldn't match up the diff sections with the changed files at commit {commit_hash}. Statuses: {statuses}"
+        for i, status in enumerate(statuses):
+            yield commit_hash, status, (''.join(patches[i]) if with_patch else None)
+    
+    # Run git & parse output
+    
+    commit_hash = None
+    statuses = []
+    patches = []
+    
+    for line in shared.iter_command_output(cmd, cwd=repo_root, keep_separator=True):
+        
+        if line.startswith('\0'):
+            # New commit
+            if commit_hash != None:
+                yield from commit_file_changes(commit_hash, statuses, patches)
+            commit_hash = line[1:].strip()
+            statuses = []
+            patches = []
+        elif line.startswith('diff --git '):
+            # New diff section
+            patches.append([line])
+        elif len(patches) > 0:
+            # Line inside a diff section
+            patches[-1].append(line)
+        elif line.startswith(':'):
+            # Raw line
+            status = parse_git_status_line(line.rstrip('\n'))
+            assert status != None, f"Couldn't parse git log line {repr(line)}"
+            statuses.append(status)
+    
+    if commit_hash != None:
+        yield from commit_file_changes(commit_hash, statuses, patches)
+
+def git_blame_lines(repo_root, rev, path):
+    
+    """
+    Runs `git blame --porcelain` on the file at `path` at commit `rev` and returns the commit that last touched each line.
+    
+    Structure of output: (One entry per line of the file)
+    [
+        {
+            'hash':             <hash_of_commit_that_last_touched_the_line>,
+            'path':             <path_of_the_file_at_that_commit>,
+            'previous_hash':    <hash_of_the_parent_commit>,                    # None if the file didn't exist before the commit
+            'previous_path':    <path_of_the_file_at_the_parent_commit>,        # None if the file didn't exist before the commit
+            'committer_time':   <unix_timestamp>,
+        },
+        ...
+    ]
+    """
+    
+    # Call git blame & parse the output
+    #   Format: Each line starts with a header `<hash> <original_line> <final_line>`. The first line of each group of consecutive lines from the same commit also has the `<line_count>`.
+    #       After the header there's info about the commit (only the first time the commit appears), followed by the content of the line prefixed by a tab.
+    #   Notes:
+    #   - The `previous` and `filename` fields belong to a group, not to the commit. When a commit contributes lines from several paths, git prints them for each group, 
+    #       and a group can leave out `previous` if the file didn't exist before the commit. So we keep track of them per group, and only take them from earlier groups if git doesn't print them.
+    
+    result = []
+    commit_times = dict()   # The committer time of each commit
+    commit_paths = dict()   # The path fields of the latest group of each commit. For groups where git doesn't print them, which it only does when the commit has a single path.
+    
+    blame_hash = None
+    group = None            # The path fields of the current group
+    group_has_path_fields = False
+    
+    for line in shared.iter_command_output(['git', '-c', 'core.quotePath=false', 'blame', '--porcelain', rev, '--', path], cwd=repo_root):
+        
+        if blame_hash == None:
+            if len(line) == 0:
+                continue
+            header = line.split(' ')
+            blame_hash = header[0]
+            if len(header) >= 4 or group == None or group['hash'] != blame_hash:
+                # Start of a group
+                group = { 'hash': blame_hash, **commit_paths.get(blame_hash, { 'path': None, 'previous_hash': None, 'previous_path': None }) }
+                group_has_path_fields = False
+        elif line.startswith('\t'):
+            result.append({ 'hash': blame_hash, 'path': group['path'], 'previous_hash': group['previous_hash'], 'previous_path': group['previous_path'], 'committer_time': commit_times.get(blame_hash, None) })
+            blame_hash = None
+        else:
+            field, _, value = line.partition(' ')
+            if field in ['previous', 'filename'] and not group_has_path_fields:
+                # Git prints the fields for this group. Don't inherit anything from earlier groups.
+                group.update({ 'path': None, 'previous_hash': None, 'previous_path': None })
+                group_has_path_fields = True
+            if field == 'filename':
+                group['path'] = value
+                commit_paths[blame_hash] = { 'path': group['path'], 'previous_hash': group['previous_hash'], 'previous_path': group['previous_path'] }
+            elif field == 'previous':
+                previous_hash, _, previous_path = value.partition(' ')
+                group['previous_hash'] = previous_hash
+                group['previous_path'] = previous_path
+            elif field == 'committer-time':
+                commit_times[blame_hash] = int(value)
+    
+    # Return
+    return result
 
 def parse_git_status_line(line):
     
     
     """
+    Parses lines of `git log --name-status` or `git log --raw --no-abbrev` output. With --name-status, blob1 and blob2 will be None.
+    
     Regular expression pattern to match the status line
     Test strings:
         M	App/UI/New UI/Main+TabView/Base.lproj/Main.storyboard
         R100	App/UI/New UI/Main+TabView/Base.lproj/Main.storyboard	App/UI/Main/Base.lproj/Main.storyboard
+        :100644 100644 1fa3b1c2d8e8cbd44ba1ae1e8a5d6f1c6e7b7c11 6f0de5c6ac7f3e14b9c1d0b5d1bd0d4c4a6b3e7a M	App/UI/Main/Base.lproj/Main.storyboard
     """
-    pattern = r"^(A|M|D|T|U|X)\t(.+)$|^(R|C)(\d+)\t(.+)\t(.+)$"
+    pattern = r"^(?::\d+ \d+ ([0-9a-f]+) ([0-9a-f]+) )?(?:(A|M|D|T|U|X)\t(.+)|(R|C)(\d+)\t(.+)\t(.+))$"
     match = re.match(pattern, line)
 
     if match:
         # Extracting data based on the matched groups
-        status = match.group(1) or match.group(3)
-        similarity = match.group(4) if match.group(4) else None
-        file1 = match.group(2) or match.group(5)
-        file2 = match.group(6) if match.group(6) else None
+        blob1 = match.group(1)
+        blob2 = match.group(2)
+        status = match.group(3) or match.group(5)
+        similarity = match.group(6) if match.group(6) else None
+        file1 = match.group(4) or match.group(7)
+        file2 = match.group(8) if match.group(8) else None
 
         if similarity: similarity = int(similarity)
 
@@ -1291,7 +2328,9 @@ def parse_git_status_line(line):
             "code": status,
             "similarity": similarity,
             "file1": file1,
-            "file2": file2
+            "file2": file2,
+            "blob1": blob1,
+            "blob2": blob2,
         }
     else:
         return None
@@ -1299,14 +2338,288 @@ def parse_git_status_line(line):
 def is_predecessor_or_equal(potential_predecessor_commit, commit):
     
     # Check which commit is 'earlier'. Works kind of like potential_predecessor_commit <= commit (returns true for equality)
-    # Not totally sure what we're doing here. 
+    # Notes:
     #   - First, we were checking for ancestry with `git merge-base``, but that slowed the whole script down a lot (maybe we could've alleviated that by changing runCLT? We have some weird options there.) (We also tried `rev-list --is-ancestor`, but it didn't help.)
-    #   - Then we updated to just comparing the commit date. I think it might make less sense than checking ancestry, and might lead to wrong results, maybe? But currently it seems to work okay and is much faster. 
-    #   - Not sure if `committed_date` or `authored_date` is better. Both seem to give the same results atm.
+    #   - Then we updated to just comparing the commit date. That's fast, but it's wrong when a commit from a branch is merged after newer commits, or when commits are rebased. 
+    #   - Now we check ancestry again, but with a CommitGraph that's loaded once per repo instead of running git for every check.
+    
+    return get_commit_graph(commit.repo_root).is_ancestor_or_equal(potential_predecessor_commit.hexsha, commit.hexsha)
+    # return potential_predecessor_commit.committed_date <= commit.committed_date
+
+#
+# Rename index
+#
+
+rename_similarity_thresholds = { # How similar (in %) a file has to be to another file to count as a rename or copy of it. 
+    
+    # Notes:
+    # - The default similarity threshold in git is 50%, but that made it so some strings files that were added for a new language were marked as copies
+    #   E.g. When App/UI/LicenseSheet/zh-Hans.lproj/LicenseSheetController.strings was added in aadba972bfccf4f3a12b8717014cb07708b3e2f7, 
+    #     it had 64% similarity with the German version, even though it was fully translated.
+    #     Between Korean and Chinese, I saw 76% similarity for 2 fully translated files.
+    #     80% as the threshold seems to work at this moment.
+    #   The high similarity between translated files is probably because all the comment lines and all the keys are the same between all languages in `.strings.` files.
+    # - IB files only exist once (in Base.lproj) so there's no risk of mixing up languages. And Xcode rewrites a lot of xml when you edit and move them, so we use git's default for those.
+    # - The Markdown templates share all their markup and links between languages, so we're careful with those, too.
+    
+    '.strings':     80,
+    '.js':          80,
+    '.stringsdict': 80,
+    '.md':          80,
+    '.xib':         50,
+    '.storyboard':  50,
+}
+
+def apply_rename_similarity_threshold(status):
+    
+    # Takes the output of parse_git_status_line() from a git command that was run with the lowest threshold in rename_similarity_thresholds. 
+    #   If the file was renamed or copied, but it's not similar enough for its file type, returns the status of a newly added file instead.
+    
+    if status['code'] in ['R', 'C']:
+        _, file_type = os.path.splitext(status['file2'])
+        if status['similarity'] < rename_similarity_thresholds[file_type]:
+            return { 'code': 'A', 'similarity': None, 'file1': status['file2'], 'file2': None, 'blob1': '0' * len(status['blob2']) if status['blob2'] else None, 'blob2': status['blob2'] }
+    
+    return status
+
+class RenameIndex:
+    
+    """
+    Reads the history of all localization files of a repo with a single `git log --raw -M -C` and remembers for every commit which files it touched, and which path each file had before the commit.
+    
+    Notes:
+    - This replaces running `git log --follow` for every file. 
+        Unlike `--follow`, git only looks for rename and copy sources among the files that match the pathspec (all files with the types in rename_similarity_thresholds), 
+        and it simplifies merges for all the files together, instead of for each file separately. For the linear history of the mmf repos that should make no difference.
+    - Git can only apply one similarity threshold, so we run it with the lowest one and then apply the threshold for each file type with apply_rename_similarity_threshold().
+    """
+    
+    def __init__(self, repo_root):
         
-    return potential_predecessor_commit.committed_date <= commit.committed_date
-    # return runCLT(f"git rev-list --is-ancestor {potential_predecessor_commit.hexsha} {commit.hexsha}").returncode == 0
-    # return runCLT(f"git merge-base --is-ancestor {potential_predecessor_commit.hexsha} {commit.hexsha}").returncode == 0
+        self.repo_root = repo_root
+        
+        self.changes_by_path = dict()       # Maps each path to the changes of the file at that path, from newest to oldest. Each change is (commit_number, commit_hash, status). `commit_number` counts up from the newest commit.
+        self.predecessor_paths = dict()     # Maps (commit_hash, path) to the path the file had before the commit, for each file that was renamed or copied.
+        
+        pathspecs = ['*' + file_type for file_type in rename_similarity_thresholds.keys()]
+        similarity_threshold = min(rename_similarity_thresholds.values())
+        
+        commits = itertools.groupby(iter_file_changes_in_log(repo_root, pathspecs, similarity_threshold, find_copies=True), key=lambda change: change[0])
+        
+        for commit_number, (commit_hash, changes) in enumerate(commits):
+            
+            statuses = [apply_rename_similarity_threshold(status) for _, status, _ in changes]
+            
+            # Find files that are gone after the commit
+            #   If a file is renamed and copied in the same commit, git reports one rename and one copy. But looking at just one of the new files (like `git log --follow` does), both are renames.
+            removed_paths = set(status['file1'] for status in statuses if status['code'] in ['R', 'D'])
+            
+            for status in statuses:
+                
+                if status['code'] == 'C' and status['file1'] in removed_paths:
+                    status = { **status, 'code': 'R' }
+                
+                path = status['file2'] or status['file1']
+                
+                self.changes_by_path.setdefault(path, []).append((commit_number, commit_hash, status))
+                if status['file2'] != None:
+                    self.predecessor_paths[(commit_hash, path)] = status['file1']
+    
+    def predecessor_path(self, commit_hash, path):
+        # Returns the path of the file before `commit_hash`, given its path at `commit_hash`.
+        return self.predecessor_paths.get((commit_hash, path), path)
+    
+    def follow(self, path):
+        
+        # Yields `(commit_hash, status)` for each commit that changed the file at `path` (relative to the repo root), from newest to oldest, following renames and copies. (Like `git log --follow`)
+        
+        newest_commit_number = -1
+        
+        while path != None:
+            
+            next_path = None
+            
+            for commit_number, commit_hash, status in self.changes_by_path.get(path, []):
+                
+                # Skip changes to the path that are newer than the rename
+                if commit_number <= newest_commit_number:
+                    continue
+                
+                yield commit_hash, status
+                
+                # Follow renames and copies
+                #   Before the file was added, there's nothing left to follow.
+                if status['code'] in ['R', 'C']:
+                    next_path = self.predecessor_path(commit_hash, path)
+                    newest_commit_number = commit_number
+                    break
+                elif status['code'] == 'A':
+                    break
+            
+            path = next_path
+
+_rename_indexes = dict()
+
+def get_rename_index(repo_root):
+    
+    # Returns the RenameIndex for the repo at `repo_root` at the current HEAD. Creates it if necessary.
+    
+    key = (os.path.realpath(repo_root), subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo_root, stdout=subprocess.PIPE, text=True).stdout.strip())
+    if key not in _rename_indexes:
+        _rename_indexes[key] = RenameIndex(key[0])
+    
+    return _rename_indexes[key]
+
+#
+# Commit graph
+#
+
+class CommitGraph:
+    
+    """
+    Loads the commit graph of a repo once with `git rev-list --parents` and answers ancestry questions without running git again.
+    
+    How is_ancestor_or_equal() works:
+    - Every commit gets a `generation` (1 for root commits, otherwise 1 + the max generation of its parents) and a `topo_index` (its position in an order where parents always come before their children).
+        An ancestor always has a lower generation and a lower topo_index than its descendants, so most negative answers are O(1).
+    - Commits on the first-parent chain of HEAD (the 'mainline') are ancestors of each other in the order of the chain, so for those it's also O(1). That's almost all commits in the mmf repos.
+    - Otherwise we search backwards from the descendant, skipping commits that can't lead to the ancestor due to their generation or topo_index. Results are memoized.
+    """
+    
+    def __init__(self, repo_root):
+        
+        self.repo_root = repo_root
+        
+        # Load graph
+        #   Note: `--topo-order --reverse` lists parents before their children
+        self.parents = dict()
+        self.generation = dict()
+        self.topo_index = dict()
+        
+        for i, line in enumerate(shared.iter_command_output(['git', 'rev-list', '--parents', '--topo-order', '--reverse', 'HEAD'], cwd=repo_root)):
+            commit_hash, *parent_hashes = line.split()
+            self.parents[commit_hash] = parent_hashes
+            self.generation[commit_hash] = 1 + max((self.generation[p] for p in parent_hashes), default=0)
+            self.topo_index[commit_hash] = i
+        
+        # Find mainline
+        self.mainline_index = dict()
+        commit_hash = line.split()[0] if len(self.parents) > 0 else None # The last line is HEAD
+        mainline = []
+        while commit_hash != None:
+            mainline.append(commit_hash)
+            commit_hash = self.parents[commit_hash][0] if len(self.parents[commit_hash]) > 0 else None
+        for i, commit_hash in enumerate(reversed(mainline)):
+            self.mainline_index[commit_hash] = i
+        
+        self.cache = dict()
+    
+    def is_ancestor_or_equal(self, ancestor, descendant):
+        
+        # Equal
+        if ancestor == descendant:
+            return True
+        
+        # Not in graph
+        #   Happens if a commit isn't reachable from HEAD. Let git figure it out.
+        if ancestor not in self.parents or descendant not in self.parents:
+            return subprocess.run(['git', 'merge-base', '--is-ancestor', ancestor, descendant], cwd=self.repo_root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        
+        # Fast paths
+        if self.generation[ancestor] >= self.generation[descendant] or self.topo_index[ancestor] > self.topo_index[descendant]:
+            return False
+        if ancestor in self.mainline_index and descendant in self.mainline_index:
+            return self.mainline_index[ancestor] < self.mainline_index[descendant]
+        
+        # Search
+        key = (ancestor, descendant)
+        if key not in self.cache:
+            
+            min_generation = self.generation[ancestor]
+            min_topo_index = self.topo_index[ancestor]
+            
+            result = False
+            visited = set()
+            stack = [descendant]
+            while len(stack) > 0:
+                commit_hash = stack.pop()
+                if commit_hash == ancestor:
+                    result = True
+                    break
+                for p in self.parents[commit_hash]:
+                    if p not in visited and self.generation[p] >= min_generation and self.topo_index[p] >= min_topo_index:
+                        visited.add(p)
+                        stack.append(p)
+            
+            self.cache[key] = result
+        
+        return self.cache[key]
+
+_commit_graphs = dict()
+
+def get_commit_graph(repo_root):
+    
+    # Returns the CommitGraph for the repo at `repo_root`. Creates it if necessary.
+    
+    key = os.path.realpath(repo_root)
+    if key not in _commit_graphs:
+        _commit_graphs[key] = CommitGraph(key)
+    
+    return _commit_graphs[key]
+
+#
+# Commit records
+#
+
+class CommitRecord:
+    
+    """
+    The info about a commit that the analysis and the markdown need. 
+        We used to store `git.Commit` objects for every change, but those load their data lazily with a separate git call per commit, and they take up a lot more memory.
+        The attribute names are the same as on `git.Commit`.
+        Use get_commit_record() instead of creating these directly. 
+    """
+    
+    __slots__ = ('hexsha', 'committed_date', 'authored_date', 'summary', 'repo_root')
+    
+    def __init__(self, hexsha, committed_date, authored_date, summary, repo_root):
+        self.hexsha = hexsha
+        self.committed_date = committed_date    # Unix timestamp
+        self.authored_date = authored_date      # Unix timestamp
+        self.summary = summary                  # First line of the commit message
+        self.repo_root = repo_root
+    
+    def __repr__(self):
+        return f"<CommitRecord {self.hexsha[:7]} {unix_date_for_markdown(self.committed_date)} {repr(self.summary)}>"
+
+_commit_records = dict()
+
+def get_commit_record(git_repo, commit_hash):
+    
+    # Returns the CommitRecord for the commit with the full hash `commit_hash`. 
+    #   The first call for a repo loads the records for all commits of HEAD with a single `git log`.
+    
+    repo_root = os.path.realpath(git_repo.working_tree_dir)
+    
+    records = _commit_records.get(repo_root, None)
+    if records == None:
+        records = _commit_records[repo_root] = { r.hexsha: r for r in _load_commit_records(repo_root, ['HEAD']) }
+    
+    record = records.get(commit_hash, None)
+    if record == None:
+        # Commit isn't reachable from HEAD
+        record = records[commit_hash] = _load_commit_records(repo_root, ['-1', commit_hash])[0]
+    
+    return record
+
+def _load_commit_records(repo_root, log_args):
+    
+    result = []
+    for line in shared.iter_command_output(['git', 'log', '--format=%H%x00%ct%x00%at%x00%s'] + log_args + ['--'], cwd=repo_root):
+        commit_hash, committed_date, authored_date, summary = line.split('\0', 3)
+        result.append(CommitRecord(commit_hash, int(committed_date), int(authored_date), summary, repo_root))
+    
+    return result
 
 #
 # General Helpers
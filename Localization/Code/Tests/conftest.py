@@ -0,0 +1,38 @@
+"""
+Shared setup for the tests of the localization scripts.
+
+Run the tests from the repo root with:
+    python3 -m pytest Localization/Code/Tests
+"""
+
+#
+# Imports
+#
+
+import os
+import sys
+import importlib.util
+
+#
+# Import functions from ../Shared folder
+#
+
+code_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if code_dir not in sys.path:
+    sys.path.append(code_dir)
+
+#
+# Helpers
+#
+
+def import_script(folder_name):
+
+    # Imports the `script.py` of the StateOfLocalization or UpdateStrings folder. Both are called `script`, so we import them under the name of their folder.
+
+    if folder_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(folder_name, os.path.join(code_dir, folder_name, 'script.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[folder_name] = module
+        spec.loader.exec_module(module)
+
+    return sys.modules[folder_name]
@@ -0,0 +1,98 @@
+"""
+Checks that shared.extract_strings_from_IB_content() produces the same .strings file as `ibtool --export-strings-file` for the IB files of the mmf repo.
+
+Notes:
+- The .strings files that are checked into the repo are our reference outputs of ibtool. UpdateStrings copies the keys and comments of the ibtool output into them,
+    and the comment of each kv-pair contains the English value. Translators only edit the values, so we compare the values against the comments.
+- On macOS with Xcode installed, we also compare the whole output against a fresh ibtool run.
+"""
+
+#
+# Imports
+#
+
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from Shared import shared
+
+#
+# Helpers
+#
+
+repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+IB_files = shared.find_localization_files(repo_root, None, ['IB'])
+translation_paths = [(file_dict['base'], path) for file_dict in IB_files for path in file_dict['translations'].keys()]
+
+def relative_path(path):
+    return os.path.relpath(path, repo_root)
+
+def extract(ib_file_path, monkeypatch):
+    monkeypatch.setattr(shared, 'extraction_cache_enabled', False)
+    return shared.extract_strings_from_IB_content(shared.read_file(ib_file_path), backend='python')
+
+def comments_and_values(strings_text):
+
+    # Maps each key to the comment above it and its value
+
+    result = dict()
+    last_comment = None
+    for token in shared.tokenize_strings_file(strings_text):
+        if token['type'] == 'comment':
+            last_comment = token['line'].strip()
+        elif token['type'] == 'kv':
+            result[token['key']] = (last_comment, token['value'])
+            last_comment = None
+    return result
+
+def value_in_comment(comment, key):
+
+    # Finds the English value of the property of `key` in an ibtool comment like `/* Class = "NSButtonCell"; title = "Value"; ObjectID = "abc-de-fgh"; */`
+
+    property = key.split('.', 1)[1]
+    match = re.search(r'; ' + re.escape(property) + r' = "((?:[^"\\]|\\.)*)"; ObjectID = ', comment)
+    return match.group(1) if match else None
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('base_path, translation_path', translation_paths, ids=[relative_path(path) for _, path in translation_paths])
+def test_matches_checked_in_strings_file(base_path, translation_path, monkeypatch):
+
+    extracted = comments_and_values(extract(base_path, monkeypatch))
+    reference = comments_and_values(shared.read_file(translation_path).replace('\u2028', '\\n')) # UpdateStrings replaces U+2028 with \n in comments, see there
+
+    assert sorted(extracted.keys()) == sorted(reference.keys())
+    for key, (comment, value) in extracted.items():
+        assert comment == reference[key][0], key
+        assert value == value_in_comment(reference[key][0], key), key
+
+def test_custom_class_objects(monkeypatch):
+
+    # ibtool puts `NS` + the xml tag into the comment, even if the object has a customClass. Make sure that our IB files have such objects, so test_matches_checked_in_strings_file() covers this.
+
+    checked_count = 0
+
+    for file_dict in IB_files:
+
+        extracted = comments_and_values(extract(file_dict['base'], monkeypatch))
+
+        for element in ET.parse(file_dict['base']).iter():
+            keys = [key for key in extracted.keys() if key.startswith(f"{element.get('id')}.")]
+            if element.get('customClass') == None or len(keys) == 0:
+                continue
+            for key in keys:
+                comment = extracted[key][0]
+                assert comment.startswith(f'/* Class = "NS{element.tag[0].upper()}{element.tag[1:]}"; '), comment
+                checked_count += 1
+
+    assert checked_count > 0
+
+@pytest.mark.skipif(not os.path.exists('/usr/bin/ibtool'), reason="ibtool only exists on macOS with Xcode installed")
+@pytest.mark.parametrize('base_path', [file_dict['base'] for file_dict in IB_files], ids=[relative_path(file_dict['base']) for file_dict in IB_files])
+def test_matches_ibtool(base_path, monkeypatch):
+    assert extract(base_path, monkeypatch) == shared.extract_strings_from_IB_file_with_ibtool(base_path)
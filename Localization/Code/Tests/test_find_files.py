@@ -0,0 +1,56 @@
+"""
+Checks that shared.find_files_with_extensions() finds the same source files that the recursive glob used to find.
+"""
+
+#
+# Imports
+#
+
+import os
+import subprocess
+
+from Shared import shared
+
+#
+# Helpers
+#
+
+def git_run(repo_root, *args):
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', '-c', 'protocol.file.allow=always', *args], cwd=repo_root, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def write(repo_root, path, content=''):
+    os.makedirs(os.path.dirname(os.path.join(repo_root, path)), exist_ok=True)
+    with open(os.path.join(repo_root, path), 'w', encoding='utf-8') as file:
+        file.write(content)
+
+#
+# Tests
+#
+
+def test_files_in_submodules_and_untracked_files(tmp_path, monkeypatch):
+
+    # Submodule
+    submodule_root = str(tmp_path / 'submodule')
+    os.makedirs(submodule_root)
+    git_run(submodule_root, 'init', '-q')
+    write(submodule_root, 'Sub/Helper.m')
+    git_run(submodule_root, 'add', '-A')
+    git_run(submodule_root, 'commit', '-q', '-m', 'Add')
+
+    # Repo
+    repo_root = str(tmp_path / 'repo')
+    os.makedirs(repo_root)
+    git_run(repo_root, 'init', '-q')
+    write(repo_root, 'App/Main.swift')
+    write(repo_root, '.gitignore', 'Ignored/\n')
+    git_run(repo_root, 'add', '-A')
+    git_run(repo_root, 'submodule', 'add', '-q', submodule_root, 'External')
+    git_run(repo_root, 'commit', '-q', '-m', 'Add')
+    write(repo_root, 'App/Untracked.m')
+    write(repo_root, 'Ignored/Ignored.m')
+    write(repo_root, 'env/Package.m')
+
+    monkeypatch.chdir(repo_root)
+    paths = shared.find_files_with_extensions(['m', 'swift'], ['env/'])
+
+    assert sorted(paths) == ['./App/Main.swift', './App/Untracked.m', './External/Sub/Helper.m']
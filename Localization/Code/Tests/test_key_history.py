@@ -0,0 +1,88 @@
+"""
+Edge cases for finding the latest change of each translation key, which the mmf history doesn't cover (or only covers by accident).
+    Each test builds a small throwaway repo.
+"""
+
+#
+# Imports
+#
+
+import os
+import subprocess
+
+import git
+
+from conftest import import_script
+
+script = import_script('StateOfLocalization')
+
+#
+# Helpers
+#
+
+def git_run(repo_root, *args):
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', *args], cwd=repo_root, check=True, stdout=subprocess.DEVNULL)
+
+def write(repo_root, path, content):
+    os.makedirs(os.path.dirname(os.path.join(repo_root, path)), exist_ok=True)
+    with open(os.path.join(repo_root, path), 'w', encoding='utf-8') as file:
+        file.write(content)
+
+def make_repo(tmp_path):
+    repo_root = str(tmp_path / 'repo')
+    os.makedirs(repo_root)
+    git_run(repo_root, 'init', '-q')
+    return repo_root
+
+#
+# Tests
+#
+
+def test_renamed_strings_file_below_similarity_threshold(tmp_path, monkeypatch):
+
+    # The rename doesn't count, so we build the diff of the 'added' file ourselves.
+    #   Values that were entered in IB contain U+2028 (LINE SEPARATOR), and splitting the file at U+2028 used to corrupt the value and record a fake change.
+    #   We also track a .js file with a lower threshold, so that git reports the rename at all.
+
+    repo_root = make_repo(tmp_path)
+
+    multiline_value = 'Line one\u2028Line two'
+    old_lines = [f'"key{i}" = "Value number {i}";' for i in range(10)]
+    write(repo_root, 'de.lproj/Old.strings', '\n'.join(old_lines + [f'"multiline" = "{multiline_value}";']) + '\n')
+    write(repo_root, 'de.lproj/Other.js', "'js_key': 'Value',\n")
+    git_run(repo_root, 'add', '-A')
+    git_run(repo_root, 'commit', '-q', '-m', 'Add')
+
+    git_run(repo_root, 'mv', 'de.lproj/Old.strings', 'de.lproj/New.strings')
+    new_lines = old_lines[:6] + [f'"key{i}" = "Changed value {i}";' for i in range(6, 10)]
+    write(repo_root, 'de.lproj/New.strings', '\n'.join(new_lines + [f'"multiline" = "{multiline_value}";']) + '\n')
+    git_run(repo_root, 'add', '-A')
+    git_run(repo_root, 'commit', '-q', '-m', 'Rename')
+
+    git_repo = git.Repo(repo_root)
+    new_path = os.path.join(repo_root, 'de.lproj/New.strings')
+
+    monkeypatch.setitem(script.rename_similarity_thresholds, '.js', 30)
+    result = script.get_latest_changes_for_files([new_path, os.path.join(repo_root, 'de.lproj/Other.js')], git_repo)[new_path]
+
+    assert set(result.keys()) == set([f'key{i}' for i in range(10)] + ['multiline'])
+    assert result['multiline']['after']['text'] == multiline_value
+    assert result['multiline']['commit'].hexsha == git_repo.head.commit.hexsha
+
+def test_commit_records_with_line_separators(tmp_path):
+
+    # Commit messages with U+2028 and several lines must not split the records of _load_commit_records()
+
+    repo_root = make_repo(tmp_path)
+
+    summaries = ['First\u2028commit', 'Second commit', 'Third\u2028commit']
+    for i, summary in enumerate(summaries):
+        write(repo_root, 'de.lproj/File.strings', f'"key" = "Value {i}";\n')
+        git_run(repo_root, 'add', '-A')
+        git_run(repo_root, 'commit', '-q', '-m', summary, '-m', 'Body line\nAnother body line\u2028with a line separator')
+
+    git_repo = git.Repo(repo_root)
+    records = script._load_commit_records(repo_root, ['HEAD'])
+
+    expected = [(commit.hexsha, commit.committed_date, summary) for commit, summary in zip(git_repo.iter_commits('HEAD'), reversed(summaries))]
+    assert [(record.hexsha, record.committed_date, record.summary) for record in records] == expected
@@ -0,0 +1,118 @@
+"""
+Checks that shared.tokenize_strings_file() finds the same things as the strings_file_regex_*() functions, which are the reference for what should match.
+"""
+
+#
+# Imports
+#
+
+import re
+import random
+
+import pytest
+
+from Shared import shared
+
+#
+# Helpers
+#
+
+kv_regex = shared.strings_file_regex_kv_line()
+
+def regex_kv_pairs(text):
+    return [(m.group(1), m.group(2), m.group(3), m.group(5).count('!') if m.group(5) else 0) for m in kv_regex.finditer(text)]
+
+def tokenizer_kv_pairs(text, allow_multiline_kv=False):
+    return [(t['git_line_diff'], t['key'], t['value'], t['is_ok_count']) for t in shared.tokenize_strings_file(text, allow_multiline_kv=allow_multiline_kv, kv_only=True)]
+
+def random_text(rng, line_count, linebreak_after_separator=False):
+
+    # Builds kv-pair-like lines with random noise in every part, so that we hit lots of matches and near-misses
+
+    noise_fragments = ['"', "'", '=', ':', ';', ',', ' ', '\t', '/', '/*', '*/', '!', '!!', 'IS_OK', 'is_ok', 'key', 'ü']
+
+    def noise(max_length):
+        return ''.join(rng.choice(noise_fragments) for _ in range(rng.randint(0, max_length)))
+
+    def whitespace():
+        return rng.choice(['', ' ', '  ', '\t'])
+
+    lines = []
+    for _ in range(line_count):
+        if rng.random() < 0.2:
+            lines.append(noise(12))
+            continue
+        separator = whitespace() + rng.choice('=:') + whitespace()
+        if linebreak_after_separator and rng.random() < 0.3:
+            separator += '\n' * rng.randint(1, 2) + whitespace()
+        lines.append(rng.choice(['', '+', '-', '+-', ' ']) + whitespace() + rng.choice('"\'') + noise(4) + rng.choice('"\'') + separator + rng.choice('"\'') + noise(4) + rng.choice('"\'') + rng.choice(';,') + noise(6))
+    return '\n'.join(lines)
+
+def is_unsupported_multiline_match(text, match):
+
+    # The regex lets `\s` span linebreaks before the key or before the separator. The tokenizer only supports linebreaks after the separator. (See the notes in tokenize_strings_file())
+
+    if '\n' in text[match.start(0):match.start(2)]:
+        return True
+    after_key = text[match.end(2)+1:]
+    return '\n' in after_key[:len(after_key) - len(after_key.lstrip())]
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('make_line', [
+    lambda n: '"' + '"=" ' * n,                 # Lots of candidates for the end of the key, but no end of the value
+    lambda n: '"key" = "value"; ' + '/!' * n,   # Lots of candidates for the start of the !IS_OK comment
+], ids=['many separators', 'many slashes'])
+def test_pathological_lines(make_line):
+
+    # These lines make the kv regex backtrack quadratically. We keep them short enough that the regex is still fast.
+
+    for n in [10, 100, 500]:
+        text = '\n'.join([make_line(n)] * 10)
+        assert tokenizer_kv_pairs(text) == regex_kv_pairs(text)
+
+def test_random_lines():
+
+    rng = random.Random(0)
+    comment_regex = shared.strings_file_regex_comment_line()
+    blank_regex = shared.strings_file_regex_blank_line()
+
+    for _ in range(3000):
+
+        text = random_text(rng, 3)
+
+        # kv-pairs
+        #   Without allow_multiline_kv, each line is matched on its own
+        assert tokenizer_kv_pairs(text) == [pair for line in text.split('\n') for pair in regex_kv_pairs(line)], repr(text)
+
+        # Comments and blank lines
+        for token in shared.tokenize_strings_file(text):
+            if token['type'] != 'kv':
+                line = token['line'].rstrip('\n')
+                expected_type = 'comment' if comment_regex.match(line) else 'blank' if blank_regex.match(line) else None
+                assert token['type'] == expected_type, repr(line)
+
+def test_random_multiline_text():
+
+    rng = random.Random(0)
+    compared_count = 0
+
+    for _ in range(3000):
+
+        text = random_text(rng, 4, linebreak_after_separator=True)
+        if any(is_unsupported_multiline_match(text, m) for m in kv_regex.finditer(text)):
+            continue
+
+        assert tokenizer_kv_pairs(text, allow_multiline_kv=True) == regex_kv_pairs(text), repr(text)
+        compared_count += 1
+
+    assert compared_count > 2000
+
+def test_value_on_next_line():
+
+    text = "'key':\n  \n  'value', // !IS_OK\n'other': 'x',"
+
+    assert tokenizer_kv_pairs(text, allow_multiline_kv=True) == regex_kv_pairs(text) == [('', 'key', 'value', 1), ('', 'other', 'x', 0)]
+    assert tokenizer_kv_pairs(text) == [('', 'other', 'x', 0)]
@@ -64,8 +64,14 @@ def main():
         # Args
         parser = argparse.ArgumentParser()
         parser.add_argument('--wet_run', required=False, action='store_true', help="Provide this arg to actually modify files. Otherwise it will just log what it would do.", default=False)
+        parser.add_argument('--no_cache', required=False, action='store_true', help="Don't read or write the extraction cache. (See shared.cached_extraction())", default=False)
+        parser.add_argument('--ib_backend', required=False, choices=['python', 'ibtool'], default=shared.IB_strings_extraction_backend, help="How to extract the strings from IB files. 'ibtool' only works on macOS with Xcode installed. (See shared.extract_strings_from_IB_file())")
         args = parser.parse_args()
         
+        if args.no_cache:
+            shared.extraction_cache_enabled = False
+        shared.IB_strings_extraction_backend = args.ib_backend
+        
         # Constants & stuff
         repo_root = os.getcwd()
         assert os.path.basename(repo_root) == 'mac-mouse-fix', "Run this script from the 'mac-mouse-fix' repo folder."
@@ -111,12 +117,17 @@ def main():
 # Update .strings files
 #
 
-def update_strings_files(files, type, repo_root):
+def update_strings_files(files, type, repo_root, extract_IB_strings=None):
     
     """
     (if type == 'sourcecode')   Update .strings files to match source code files which they translate
     (if type == 'IB')           Update .strings files to match .xib/.storyboard files which they translate
     
+    Doesn't write anything. Returns the new content for the files that need updating, and main() writes them at the end.
+    
+    `extract_IB_strings`:   Function that takes the path of an IB file and returns the content of the generated .strings file. 
+                                Defaults to shared.extract_strings_from_IB_file(), which uses shared.IB_strings_extraction_backend. Pass in something else to test this without ibtool.
+    
     Discussion:
     
     - On location of English (development language) UI strings:
@@ -137,55 +148,68 @@ def update_strings_files(files, type, repo_root):
     assert type in ['sourcecode', 'IB'], f"UpdateStrings script is incorrect."
     if type == 'sourcecode': xcassert(len(files) == 1, "There should only be one base .strings file - Localizable.strings")
     
+    if extract_IB_strings == None:
+        extract_IB_strings = shared.extract_strings_from_IB_file
+    
+    # Get updates for each base file
+    results = [updated_strings_files_for_base(file_dict['base'], list(file_dict['translations'].keys()), type, repo_root, extract_IB_strings) for file_dict in files]
+    
+    # Collect
     updated_files = [] # This is for updating files
     modss = [] # This is for debugging
-    
-    for file_dict in files:
-    
-        # Autogenerate fresh .strings file from the source files (IB/sourcecode) using Apples tools
-        #   Notes:
-        #   - The fresh strings file will have its comments and keys up-to-date with the source file
-        #   - We store the content of these fresh strings files inside generated_content
-        
-        generated_content = ''
-        
-        if type == 'sourcecode':
-            source_code_files = shared.find_files_with_extensions(['m','c','cp','mm','swift'], ['env/', 'venv/', 'iOS-Polynomial-Regression-master/', './Test/'])
-            source_code_files_str = ' '.join(map(lambda p: p.replace(' ', r'\ '), source_code_files))
-            shared.runCLT(f"xcrun extractLocStrings {source_code_files_str} -SwiftUI -o ./{temp_folder}", exec='/bin/zsh')
-            generated_path = f"{temp_folder}/Localizable.strings"
-            generated_content = shared.read_file(generated_path, 'utf-16')
-        elif type == 'IB':
-            base_file_path = file_dict['base']
-            generated_path = shared.extract_strings_from_IB_file_to_temp_file(base_file_path)
-            generated_content = shared.read_tempfile(generated_path)
-        else: 
-            assert False
-        
-        # Find all the .strings files that translate the source files
-        translation_file_paths = list(file_dict['translations'].keys())
-        if type == 'sourcecode':
-            translation_file_paths.append(file_dict['base'])
-        
-        for path in translation_file_paths:
-                
-            # Update the translation .strings file
-            #   using the keys and comments of the generated .strings file
-            content = shared.read_file(path, 'utf-8')
-            new_content, mods, ordered_keys = updated_strings_file_content(content, generated_content, path, repo_root)
-            
-            # Store updates
-            if new_content != content:
-                updated_files.append({"path": path, "new_content": new_content})
-            
-            # Debug
-            modss.append({'path': path, 'mods': mods, 'ordered_keys': ordered_keys})
+    for file_updated_files, file_modss in results:
+        updated_files += file_updated_files
+        modss += file_modss
 
     # Return
     return updated_files, modss
+
+def updated_strings_files_for_base(base_file_path, translation_file_paths, type, repo_root, extract_IB_strings):
+    
+    # Does the work of update_strings_files() for a single base file and its translations. Returns (updated_files, modss) for these files.
     
+    # Autogenerate fresh .strings file from the source files (IB/sourcecode) using Apples tools
+    #   Notes:
+    #   - The fresh strings file will have its comments and keys up-to-date with the source file
+    #   - We store the content of these fresh strings files inside generated_content
+    
+    generated_content = ''
+    
+    if type == 'sourcecode':
+        source_code_files = shared.find_files_with_extensions(['m','c','cp','mm','swift'], ['env/', 'venv/', 'iOS-Polynomial-Regression-master/', './Test/'])
+        source_code_files_str = ' '.join(map(lambda p: p.replace(' ', r'\ '), source_code_files))
+        shared.runCLT(f"xcrun extractLocStrings {source_code_files_str} -SwiftUI -o ./{temp_folder}", exec='/bin/zsh')
+        generated_path = f"{temp_folder}/Localizable.strings"
+        generated_content = shared.read_file(generated_path, 'utf-16')
+    elif type == 'IB':
+        generated_content = extract_IB_strings(base_file_path)
+    else: 
+        assert False
+    
+    # Find all the .strings files that translate the source files
+    translation_file_paths = list(translation_file_paths)
+    if type == 'sourcecode':
+        translation_file_paths.append(base_file_path)
+    
+    updated_files = []
+    modss = []
+    
+    for path in translation_file_paths:
+            
+        # Update the translation .strings file
+        #   using the keys and comments of the generated .strings file
+        content = shared.read_file(path, 'utf-8')
+        new_content, mods, ordered_keys = updated_strings_file_content(content, generated_content, path, repo_root)
         
+        # Store updates
+        if new_content != content:
+            updated_files.append({"path": path, "new_content": new_content})
         
+        # Debug
+        modss.append({'path': path, 'mods': mods, 'ordered_keys': ordered_keys})
+    
+    # Return
+    return updated_files, modss
 
 #
 # Debug helper
@@ -369,16 +393,11 @@ def parse_strings_file_content(content, file_path, remove_value=False):
     }
     
     Notes:
-    - See shared.strings_file_regex() for context.
+    - See shared.tokenize_strings_file() for context.
     """
     
     result = {}
     
-    kv_regex        = shared.strings_file_regex_kv_line()
-    comment_regex   = shared.strings_file_regex_comment_line()
-    blank_regex     = shared.strings_file_regex_blank_line()
-    
-    
     #
     # Approach 1: Line-based approach
     #
@@ -392,6 +411,8 @@ def parse_strings_file_content(content, file_path, remove_value=False):
             - We used splitlines(True) to iterate lines, but this didn't work, because the strings sometimes contain the character 'LINE SEPARATOR' (U+2028) if you enter a linebreak in IB, and splitlines splits at those characters. (Example for this is the '+' field hint.)
                 - Note: Gave GitHub Feedback at: https://github.com/orgs/community/discussions/84092
             - But by simply using .split('\n') it seems to work!
+            - Update: We don't apply the regexes to each line anymore. shared.tokenize_strings_file() classifies the lines in one pass, matching the same things as the regexes, but in linear time. 
+                It always classifies the whole line, so we don't need to check for partial matches anymore.
         - match-based approach:
             - The match-based applies the regext for finding kv-pairs to the whole string, and then iterates through the matches.
             - This works fine, butttt if you forget to put a semicolon at the end, then it will consider the whole kv-pair part of a comment, and will simply delete it.
@@ -400,33 +421,19 @@ def parse_strings_file_content(content, file_path, remove_value=False):
         That's nice, but I don't understand why it's happending. Might be coming from this function. Edit: It think it's just because we replace the comments and the comments from the generated content don't have double line breaks.
     """
     
-    def assert_full_match(match, line, name, line_number):
-        match_end_target = 0 if len(line) == 0 else len(line) - 1
-        
-        if not (match.start(0) == 0 and match.end(0) == match_end_target):
-            xcerror(f"Line is matched by {name}, but only partially. This means there is probably something weird with the syntax / formatting.",
-                           file_path, line_number)
-    
     last_key_line_number = -1
     last_key = ''
     acc_comment = ''
 
-    lines = content.split('\n')
-    for i, line in enumerate(lines): # `True` preserves linebreaks, so that we can easily stitch everything together exactly as it was.
+    for token in shared.tokenize_strings_file(content):
         
-        if i != len(lines) - 1:
-            line += '\n'
+        line = token['line']
         
-        kv_match = kv_regex.match(line)
-
-        if kv_match:
+        if token['type'] == 'kv':
             
-            assert_full_match(kv_match, line, 'kv_regex', i+1)
-
-            key = kv_match.group(2)
+            key = token['key']
             if remove_value:
-                value_start = kv_match.start(3)
-                value_end = kv_match.end(3)
+                value_start, value_end = token['value_span']
                 result_line = line[:value_start] + line[value_end:]
             else:
                 result_line = line
@@ -435,19 +442,12 @@ def parse_strings_file_content(content, file_path, remove_value=False):
             acc_comment = ''
 
             last_key = key
-            last_key_line_number = i+1
-        else:
-            comment_match = comment_regex.match(line)
-            blank_match = blank_regex.match(line)
-            
-            if comment_match:
-                assert_full_match(comment_match, line, 'comment_regex', i+1)
-            elif blank_match:
-                assert_full_match(blank_match, line, 'blank_regex', i+1)
-            else:
-                xcerror(f"Line doesn't match kv, comment, or blank line regex. That means there's probably something weird with the syntax / formatting.", file_path, i+1)
+            last_key_line_number = token['line_number']
             
+        elif token['type'] == 'comment' or token['type'] == 'blank':
             acc_comment += line 
+        else:
+            xcerror(f"Line doesn't look like a kv-pair, comment, or blank line. That means there's probably something weird with the syntax / formatting.", file_path, token['line_number'])
 
     post_comment = acc_comment
     if not len(post_comment.strip()) == 0: xcerror(f"There's content under the last key-value-pair (this line). Don't know what to do with that. Pls remove?", file_path, last_key_line_number)